@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmarks of TaskParser and TaskListCLI on generated todo lists.
+
+usage: bench.py [--sizes N [N ...]] [--backends NAME [NAME ...]]
+                [--repeat N] [--output FILE] [--baseline FILE]
+                [--tolerance FRACTION] [--min-time SECONDS]
+                [--startup-budget SECONDS]
+
+Every benchmark is run a few times and the best time in seconds is
+reported. Results are printed (or written to FILE) as JSON, so they can be
+kept as a baseline. With --baseline the results are compared to an older
+run and the script exits with status 1 if any benchmark got slower by more
+than the tolerance. Benchmarks faster than --min-time in the baseline are
+shown but not checked, as they are mostly noise.
+
+Startup of the CLI is measured on its own, as the time over a bare
+interpreter start. The script also exits with status 1 if that time is
+over the startup budget, or if a backend which can select tasks itself
+(see Storage.query) is not asked to for a sorted list of incomplete tasks
+after an update, as pytasks -i --sorted does.
+"""
+
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import datetime
+import platform
+import argparse
+import tempfile
+import subprocess
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       os.pardir, 'src')
+sys.path.insert(0, SRC_DIR)
+
+import cons
+import codec
+import storage
+import recurrence
+import parser
+import tasklist
+import scheduler
+from task import Task
+from stats import STATS
+
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+# name, arguments of the CLI and number of tasks (None for no todo file)
+STARTUP_COMMANDS = (
+    ('help', ['--help'], None),
+    ('incomp_new', ['-i'], None),
+    ('incomp', ['-i'], 10),
+)
+LIST_OPTIONS = [(comp, incomp, sort)
+                for comp, incomp in ((True, True), (True, False),
+                                     (False, True))
+                for sort in (False, True)]
+
+
+def generate_tasks(count, seed=0):
+    """Return a list of tasks with mixed dates, intervals and statuses."""
+    rnd = random.Random(seed)
+    today = datetime.date.today()
+    intervals = (None, None, None, 1, 7, 30, cons.MONTH, cons.YEAR)
+    tasks = []
+    for i in range(count):
+        if rnd.random() < 0.3:
+            date = None
+        else:
+            date = today + datetime.timedelta(days=rnd.randint(-1500, 365))
+        tasks.append(Task(
+            'task {} {}'.format(i, 'x' * rnd.randint(0, 40)),
+            date,
+            rnd.choice(intervals) if date else None,
+            rnd.random() < 0.4,
+            i + 1))
+    return tasks
+
+
+def measure(func, setup=None, repeat=3):
+    """Return the best time of func, setup is called before every run and
+    its result is passed to func.
+    """
+    best = None
+    for i in range(repeat):
+        args = (setup(),) if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+class Bench:
+    """Benchmarks of one backend on a todo list of one size."""
+
+    def __init__(self, data_home, backend, tasks, repeat):
+        self.data_home = data_home
+        self.backend = backend
+        self.tasks = tasks
+        self.repeat = repeat
+        self.data_dir = os.path.join(data_home, cons.NAME.lower())
+        self.path = os.path.join(self.data_dir, cons.DATA_FILENAME)
+
+    def reset(self, tasks=None):
+        """Write the generated tasks, or the given ones, and drop other
+        files of the list.
+        """
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+        os.makedirs(self.data_dir)
+        storage.JSONStorage(self.path).save(
+            self.tasks if tasks is None else tasks)
+        # other backends import the todo file when they are created
+        storage.open_storage(self.path, self.backend)
+
+    def parser(self, cls=parser.TaskParser):
+        return cls(self.path, self.backend)
+
+    def run(self):
+        self.reset()
+        results = {}
+
+        def bench(name, func, setup=None):
+            results[name] = measure(func, setup, self.repeat)
+
+        bench('load', lambda: self.parser().get_tasks())
+        # tasks streamed from the storage, dates of others are not decoded
+        bench('iter_tasks_cold', lambda: sum(
+            1 for task in self.parser().iter_tasks(done=True)))
+        bench('count_tasks_cold', lambda: self.parser().count_tasks(done=True))
+        p = self.parser()
+        p.get_tasks()
+        bench('get_tasks', p.get_tasks)
+        bench('save_tasks', lambda: p.save_tasks(self.tasks))
+        bench('advance', recurrence.advance_tasks,
+              lambda: [task.copy() for task in self.tasks])
+        bench('update', lambda p: p.update(),
+              lambda: self.reset() or self.parser())
+        bench('archive_tasks', lambda p: p.archive_tasks(),
+              lambda: self.reset() or self.parser())
+
+        self.reset()
+        p = self.parser()
+        middle = len(self.tasks) // 2
+        p.get_tasks()
+        bench('add_task', lambda: p.add_task('new task',
+                                             datetime.date.today()))
+        bench('edit_task', lambda: p.edit_task(middle, done=True,
+                                               text='edited'))
+        bench('delete_task', lambda: p.delete_task(middle))
+        bench('swap_task', lambda: p.swap_task(0, middle))
+
+        self.reset()
+        for comp, incomp, sort in LIST_OPTIONS:
+            name = 'list_tasks[comp={:d},incomp={:d},sort={:d}]'.format(
+                comp, incomp, sort)
+            bench(name, lambda: self.parser(tasklist.TaskListCLI).list_tasks(
+                comp=comp, incomp=incomp, sort=sort))
+
+        bench('list_tasks[incomp=1,sort=1,limit=10]',
+              lambda: self.parser(tasklist.TaskListCLI).list_tasks(
+                  comp=False, sort=True, limit=10))
+
+        # the first search makes the index
+        bench('search_index', lambda p: p.search('task 1'),
+              lambda: self.reset() or self.parser())
+        p = self.parser()
+        bench('search', lambda: p.search('task 1'))
+        bench('search_cold', lambda: self.parser().search('task 1'))
+
+        today = datetime.date.today()
+        week = today + datetime.timedelta(days=8)
+        # the first query makes the date index
+        p = self.parser()
+        bench('due_within', lambda: p.select_tasks(since=today, before=week))
+        bench('due_within_cold', lambda: self.parser().select_tasks(
+            since=today, before=week))
+        # the heap of pytasks --watch, made when tasks change
+        bench('reminders', lambda: scheduler.ReminderScheduler(
+            self.parser(tasklist.TaskListCLI), []))
+
+        for name, args in (('cli_help', ['--help']), ('cli_list', ['-l']),
+                           ('cli_incomp_sorted', ['-i', '--sorted']),
+                           ('cli_incomp_sorted_limit',
+                            ['-i', '--sorted', '--limit', '5']),
+                           ('cli_search', ['--search', 'task 1']),
+                           ('cli_due_within', ['--due-within', '7'])):
+            bench(name, lambda: self.run_cli(args))
+        return results
+
+    def check_query(self):
+        """Return False if the backend can select tasks itself but a
+        sorted list of incomplete tasks is not selected by it after an
+        update.
+        """
+        if storage.BACKENDS[self.backend].query is storage.Storage.query:
+            return True
+        # an update which moves no date has to mark the storage too
+        tasks = [task.copy() for task in self.tasks]
+        recurrence.advance_tasks(tasks, datetime.date.today())
+        self.reset(tasks)
+        self.parser().update()
+        STATS.reset()
+        self.parser().select_tasks(comp=False, sort=True)
+        used = 'query' in STATS.timings and 'load' not in STATS.timings
+        STATS.reset()
+        if not used:
+            print('{} backend: sorted tasks not selected by the storage'
+                  .format(self.backend), file=sys.stderr)
+        return used
+
+    def run_cli(self, args):
+        """Run the CLI in a new interpreter, as a user would."""
+        run_cli(self.data_home, args, self.backend)
+
+
+def run_cli(data_home, args, backend='json'):
+    env = dict(os.environ, XDG_DATA_HOME=data_home, PYTASKS_STORAGE=backend)
+    subprocess.check_call(
+        [sys.executable, os.path.join(SRC_DIR, 'cli.py')] + args,
+        env=env, cwd=SRC_DIR, stdout=subprocess.DEVNULL)
+
+
+def run_startup(data_home, repeat):
+    """Return startup times of a bare interpreter ('python') and of the
+    CLI commands in STARTUP_COMMANDS.
+    """
+    results = {'python': measure(
+        lambda: subprocess.check_call([sys.executable, '-c', 'pass']),
+        repeat=repeat)}
+    data_dir = os.path.join(data_home, cons.NAME.lower())
+    for name, args, count in STARTUP_COMMANDS:
+        shutil.rmtree(data_dir, ignore_errors=True)
+        if count is not None:
+            os.makedirs(data_dir)
+            storage.JSONStorage(os.path.join(
+                data_dir, cons.DATA_FILENAME)).save(generate_tasks(count))
+        results[name] = measure(lambda: run_cli(data_home, args),
+                                repeat=repeat)
+    return results
+
+
+def check_startup(results, budget):
+    """Print the startup overhead of commands, return the number of ones
+    over the budget.
+    """
+    over = 0
+    for name, elapsed in sorted(results.items()):
+        if name == 'python':
+            continue
+        overhead = elapsed - results['python']
+        flag = ''
+        if overhead > budget:
+            flag = '  OVER BUDGET'
+            over += 1
+        print('startup {:20} {:10.6f} over python{}'.format(
+            name, overhead, flag), file=sys.stderr)
+    return over
+
+
+def compare(results, baseline, tolerance, min_time):
+    """Print results next to the baseline, return the number of
+    regressions.
+    """
+    regressions = 0
+    for name, elapsed in sorted(results.items()):
+        old = baseline.get(name)
+        if old is None:
+            continue
+        change = (elapsed - old) / old if old else 0
+        flag = ''
+        if change > tolerance and old >= min_time:
+            flag = '  REGRESSION'
+            regressions += 1
+        print('{:60} {:10.6f} {:10.6f} {:+7.1%}{}'.format(
+            name, old, elapsed, change, flag), file=sys.stderr)
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(
+            description='Benchmarks of pytasks on generated todo lists')
+    ap.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES,
+                    metavar='N', help='numbers of tasks')
+    ap.add_argument('--backends', nargs='+', default=['json'],
+                    choices=sorted(storage.BACKENDS), metavar='NAME',
+                    help='storage backends')
+    ap.add_argument('--repeat', type=int, default=3,
+                    help='runs of every benchmark')
+    ap.add_argument('--output', type=argparse.FileType('w'),
+                    default=sys.stdout, metavar='FILE',
+                    help='file for the results')
+    ap.add_argument('--baseline', type=argparse.FileType('r'),
+                    metavar='FILE', help='results to compare with')
+    ap.add_argument('--tolerance', type=float, default=0.2,
+                    metavar='FRACTION',
+                    help='allowed slowdown against the baseline')
+    ap.add_argument('--min-time', type=float, default=0.001,
+                    metavar='SECONDS',
+                    help='do not check benchmarks faster than this')
+    ap.add_argument('--startup-budget', type=float, default=0.05,
+                    metavar='SECONDS',
+                    help='allowed startup time of the CLI over a bare '
+                    'interpreter')
+    args = ap.parse_args()
+
+    results = {}
+    failed = False
+    data_home = tempfile.mkdtemp(prefix='pytasks-bench-')
+    try:
+        startup = run_startup(data_home, max(args.repeat, 5))
+        for name, elapsed in startup.items():
+            results['startup/{}'.format(name)] = elapsed
+        for size in args.sizes:
+            tasks = generate_tasks(size)
+            for backend in args.backends:
+                print('{} tasks, {} backend'.format(size, backend),
+                      file=sys.stderr)
+                bench = Bench(data_home, backend, tasks, args.repeat)
+                for name, elapsed in bench.run().items():
+                    results['{}/{}/{}'.format(backend, size, name)] = elapsed
+                if not bench.check_query():
+                    failed = True
+    finally:
+        shutil.rmtree(data_home, ignore_errors=True)
+
+    json.dump({
+        'meta': {
+            'date': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            # library of JSON todo files, see codec
+            'json': codec.library(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+        },
+        'results': results
+    }, args.output, indent=2, sort_keys=True)
+    args.output.write('\n')
+
+    if check_startup(startup, args.startup_budget):
+        failed = True
+    if args.baseline:
+        baseline = json.load(args.baseline)['results']
+        if compare(results, baseline, args.tolerance, args.min_time):
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The archive of a todo list keeps completed tasks moved out of it (see
+# TaskParser.archive_tasks), so the list itself holds only active work.
+#
+# The archive file is a sequence of segments, one for every archiving.
+# A segment has a header with the size of its data, the number of its
+# tasks and their highest ID, all 4-byte big-endian numbers, and zlib
+# compressed data with one task per line, encoded as in JSON todo files
+# (see codec). Segments are only appended, a segment cut by a crash is
+# dropped by the next one.
+
+
+import os
+import zlib
+import struct
+
+import cons
+import codec
+from stats import STATS
+
+
+_HEADER = struct.Struct('>III')
+
+
+class Archive:
+    """Append-only compressed file of archived tasks.
+
+    Tasks are read only when they are asked for, segment by segment, so
+    neither the list nor a big archive is decoded or held in memory for
+    nothing.
+    """
+
+    def __init__(self, path):
+        """arguments:
+        path -- path of the archive file (see path_for)
+        """
+        self.path = path
+
+    @staticmethod
+    def path_for(tasks_path):
+        """Return the path of the archive of a todo file."""
+        return '{}.archive'.format(os.path.splitext(tasks_path)[0])
+
+    def _segments(self, f):
+        """Return offsets, sizes, numbers of tasks and highest IDs of whole
+        segments of the open file.
+        """
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell()
+        segments = []
+        offset = 0
+        while offset + _HEADER.size <= file_size:
+            f.seek(offset)
+            size, count, last_id = _HEADER.unpack(f.read(_HEADER.size))
+            if offset + _HEADER.size + size > file_size:
+                break
+            segments.append((offset, size, count, last_id))
+            offset += _HEADER.size + size
+        return segments
+
+    def append(self, tasks):
+        """Add a segment with the tasks and sync it to the disk."""
+        data = ''.join(codec.dumps(codec.encode_task(task)) + '\n'
+                       for task in tasks)
+        data = zlib.compress(data.encode('utf-8'))
+        last_id = max(task.id for task in tasks)
+        segment = _HEADER.pack(len(data), len(tasks), last_id) + data
+        STATS.count('file_opens')
+        STATS.count('bytes_written', len(segment))
+        with open(self.path, 'a+b') as f:
+            # drop a segment left by a crash, writes go to the end
+            segments = self._segments(f)
+            if segments:
+                offset, size, count, last_id = segments[-1]
+                f.truncate(offset + _HEADER.size + size)
+            else:
+                f.truncate(0)
+            f.write(segment)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def iter_tasks(self, dates=True):
+        """Yield archived tasks in the order they were archived, without
+        their dates if dates is False.
+
+        A broken segment ends the archive.
+        """
+        STATS.count('file_opens')
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            for offset, size, count, last_id in self._segments(f):
+                f.seek(offset + _HEADER.size)
+                decompressor = zlib.decompressobj()
+                rest = b''
+                while size:
+                    chunk = f.read(min(size, cons.READ_CHUNK_SIZE))
+                    if not chunk:
+                        return
+                    STATS.count('bytes_read', len(chunk))
+                    size -= len(chunk)
+                    try:
+                        lines = (rest + decompressor.decompress(chunk)).split(
+                            b'\n')
+                        rest = lines.pop()
+                        tasks = [codec.decode_task(codec.loads(line), dates)
+                                 for line in lines]
+                    except (zlib.error, ValueError):
+                        return
+                    yield from tasks
+
+    def _read_segments(self):
+        STATS.count('file_opens')
+        try:
+            with open(self.path, 'rb') as f:
+                return self._segments(f)
+        except FileNotFoundError:
+            return []
+
+    def count(self):
+        """Return the number of archived tasks, only headers are read."""
+        return sum(segment[2] for segment in self._read_segments())
+
+    def next_id(self):
+        """Return the ID after the highest archived one, only headers are
+        read.
+        """
+        return max([segment[3] for segment in self._read_segments()] or
+                   [0]) + 1
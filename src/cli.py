@@ -2,117 +2,45 @@
 # -*- coding: utf-8 -*-
 
 
+# Shell prompts and status bars run pytasks all the time, so only modules
+# needed to parse arguments are imported here. The parser and storages are
+# imported when a command runs and the data directory is created on the
+# first write.
+
+import os
+import sys
 import argparse
-import operator
 
-import parser
 import cons
 
 
-class InvalidIndexError(Exception):
-    pass
-
-
-class TaskListCLI(parser.TaskParser):
-
-    def is_valid_index(self, index):
-        return 0 < index <= len(self.get_tasks())
-
-    def add(self, text):
-        self.add_task(text)
-
-    def delete(self, index):
-        if not self.is_valid_index(index):
-            raise InvalidIndexError('\'{}\' is not a valid index'.format(
-                index))
-        else:
-            self.delete_task(index - 1)
-
-    def mark(self, index):
-        """Change the status of the task."""
-        if not self.is_valid_index(index):
-            raise InvalidIndexError('\'{}\' is not a valid index'.format(
-                index))
-        else:
-            self.edit_task(index - 1, done=\
-                    not self.get_tasks()[index - 1]['done'])
-
-    def __str__(self):
-        return self.list_tasks()
-
-    def list_tasks(self, comp=True, incomp=True, status=True, number=True,
-                   sort=False):
-        """Return a formatted string with proper tasks.
-
-        arguments:
-        comp -- show completed tasks
-        incomp -- show incompleted tasks
-        status -- show status of tasks
-        number -- show numbered tasks
-        sort -- show sorted tasks by date
-
-        By default the method returns formatted string with numbered all tasks
-        and their status.
-        """
-        def filter_task(date, done):
-            passed = False
-            if comp and incomp:
-                passed = True
-            elif comp and done:
-                passed = True
-            elif incomp and not done:
-                passed = True
-            else:
-                passed = False
-            if passed and sort and not date:
-                passed = False
-            return passed
-        tasks = [task for task in self.get_tasks() \
-                if filter_task(task['date'], task['done'])]
-        if sort:
-            tasks = sorted(tasks, key=operator.itemgetter('date'))
-        def format_task(text, date, done):
-            if date:
-                date = date.strftime(cons.DATE_FORMAT)
-                s = '{} ({})'.format(text, date)
-                if status:
-                    if done:
-                        return '[*] {}'.format(s)
-                    else:
-                        return '[ ] {}'.format(s)
-                else:
-                    return s
-            else:
-                if status:
-                    if done:
-                        return '[*] {}'.format(text)
-                    else:
-                        return '[ ] {}'.format(text)
-                else:
-                    return text
-        if number:
-            return '\n'.join('{}. {}'.format(n + 1, format_task(
-                task['text'],
-                task['date'],
-                task['done']
-                )) for n, task in enumerate(tasks))
-        else:
-            return '\n'.join(format_task(
-                task['text'],
-                task['date'],
-                task['done']
-                ) for task in tasks)
+def __getattr__(name):
+    # TaskListCLI used to be defined here
+    if name in ('TaskListCLI', 'InvalidIndexError'):
+        import tasklist
+        return getattr(tasklist, name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(
+        __name__, name))
 
 
 def main():
     ap = argparse.ArgumentParser(
             description='A todo list with interval option')
-    ap.add_argument('-a', '--add', nargs='+', metavar='DESCRIPTION',
-                    help='add a task')
-    ap.add_argument('-d', '--delete', nargs=1, type=int, metavar='ID',
-                    help='delete a task')
-    ap.add_argument('-m', '--mark', nargs=1, type=int, metavar='ID',
-                    help='mark a task')
+    ap.add_argument('-a', '--add', nargs='+', action='append',
+                    metavar='DESCRIPTION', help='add a task (repeatable)')
+    ap.add_argument('--add-from', type=argparse.FileType('r'),
+                    metavar='FILE',
+                    help='add a task for every line of the file '
+                    '(\'-\' reads stdin)')
+    ap.add_argument('-d', '--delete', nargs='+', action='extend',
+                    metavar='ID', help='delete tasks (numbers or @IDs)')
+    ap.add_argument('-m', '--mark', nargs='+', action='extend',
+                    metavar='ID', help='mark tasks (numbers or @IDs)')
+    ap.add_argument('--list-name', action='append', metavar='NAME',
+                    help='use the named list instead of the default one '
+                    '(repeatable, shell patterns like \'work-*\' choose '
+                    'existing lists), tasks of many lists are listed '
+                    'together')
     ap.add_argument('-l', '--list', action='store_true',
                     help='list all tasks')
     ap.add_argument('-c', '--comp', action='store_true',
@@ -121,33 +49,267 @@ def main():
                     help='list incompleted tasks')
     ap.add_argument('--sorted', action='store_true',
                     help='tasks with date sorted by it')
+    ap.add_argument('--search', metavar='QUERY',
+                    help='list tasks with words beginning with every word '
+                    'of the query')
+    ap.add_argument('--due-before', type=parse_date, metavar='DATE',
+                    help='list tasks with a date before DATE (DD.MM.YY), '
+                    'sorted by it')
+    ap.add_argument('--due-within', type=int, metavar='N',
+                    help='list tasks with a date from today to N days '
+                    'later, sorted by it')
+    ap.add_argument('--overdue', action='store_true',
+                    help='list tasks with a date before today, sorted by it')
+    ap.add_argument('--limit', type=count, metavar='N',
+                    help='list at most N tasks')
+    ap.add_argument('--offset', type=count, default=0, metavar='K',
+                    help='skip the first K listed tasks')
     ap.add_argument('-s', '--status', action='store_false',
                     help='don\'t show status')
     ap.add_argument('-n', '--number', action='store_false',
                     help='tasks not numbered')
+    ap.add_argument('--ids', action='store_true', help='show IDs of tasks')
     ap.add_argument('--update', action='store_true', help='update all tasks')
+    ap.add_argument('--archive', nargs='?', type=int,
+                    const=cons.ARCHIVE_AGE, metavar='DAYS',
+                    help='move completed tasks without an interval to the '
+                    'archive, ones without a date or dated over DAYS days '
+                    'ago (default {})'.format(cons.ARCHIVE_AGE))
+    ap.add_argument('--include-archive', action='store_true',
+                    help='list completed tasks of the archive too')
+    ap.add_argument('--stats', action='store_true',
+                    help='print counters and timings of the command '
+                    'to stderr')
+    ap.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+                    help='profile the command, print a report to stderr '
+                    'or save raw data to the file')
+    ap.add_argument('--daemon', action='store_true',
+                    help='keep the todo list loaded and serve other '
+                    'pytasks calls')
+    ap.add_argument('--watch', action='store_true',
+                    help='keep running and print reminders of incompleted '
+                    'tasks when their dates come (at {}:00)'.format(
+                        cons.REMIND_HOUR))
+    ap.add_argument('--watch-command', metavar='COMMAND',
+                    help='run the command with every reminder as its last '
+                    'argument instead of printing it, e.g. '
+                    '\'notify-send PyTasks\'')
+
+    argv = sys.argv[1:]
+    args = ap.parse_args(argv)
+    if args.daemon:
+        import daemon
+        daemon.serve(ap, run)
+        return
+    if args.watch:
+        watch(ap, args)
+        return
+    # the daemon serves only the default list
+    if not (args.add_from or args.profile or args.stats or args.list_name):
+        status = forward(argv)
+        if status is not None:
+            sys.exit(status)
+    from stats import STATS
+    if args.profile:
+        # imported here, so normal runs do not pay for it
+        import cProfile
+        import pstats
+        profile = cProfile.Profile()
+        profile.runcall(run, ap, args)
+        if args.profile == '-':
+            pstats.Stats(profile, stream=sys.stderr).sort_stats(
+                'cumulative').print_stats(30)
+        else:
+            profile.dump_stats(args.profile)
+    else:
+        with STATS.timer('command'):
+            run(ap, args)
+    if args.stats:
+        print(STATS.report(), file=sys.stderr)
+
+
+def count(text):
+    """Return the number of tasks given by an option."""
+    try:
+        n = int(text)
+    except ValueError:
+        n = -1
+    if n < 0:
+        raise argparse.ArgumentTypeError(
+            '\'{}\' is not a number of tasks'.format(text))
+    return n
+
+
+def parse_date(text):
+    """Return the date written in cons.DATE_FORMAT."""
+    import datetime
+    try:
+        return datetime.datetime.strptime(text, cons.DATE_FORMAT).date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            '\'{}\' is not a date (DD.MM.YY)'.format(text))
+
 
-    args = ap.parse_args()
-    tl = TaskListCLI(cons.DATA_FILE)
-    if args.add:
-        tl.add(' '.join(args.add))
-    elif args.delete:
-        tl.delete(args.delete[0])
-    elif args.mark:
-        tl.mark(args.mark[0])
-    elif args.list:
-        print(tl.list_tasks(status=args.status, number=args.number,
-                            sort=args.sorted))
+def due_range(args):
+    """Return the range of dates chosen by --due-before, --due-within and
+    --overdue: the first date and the one after the last, None for no
+    limit. --overdue with --due-within lists both overdue tasks and the
+    ones due soon.
+    """
+    import datetime
+    today = datetime.date.today()
+    since = None
+    before = args.due_before
+    if args.due_within is not None:
+        end = today + datetime.timedelta(days=args.due_within + 1)
+        before = end if before is None else min(before, end)
+        if not args.overdue:
+            since = today
+    elif args.overdue:
+        before = today if before is None else min(before, today)
+    return since, before
+
+
+def forward(argv):
+    """Run the command by the daemon, if it is running.
+
+    Return the exit status of the command or None if there is no daemon.
+    The protocol is described in daemon.py.
+    """
+    if not os.path.exists(cons.SOCKET_FILE):
+        return None
+    import socket
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(cons.SOCKET_FILE)
+    except OSError:
+        sock.close()
+        return None
+    with sock, sock.makefile('rb') as f:
+        data = '\0'.join(argv).encode('utf-8')
+        sock.sendall(len(data).to_bytes(4, 'big') + data)
+        frames = []
+        for i in range(3):
+            size = int.from_bytes(f.read(4), 'big')
+            frames.append(f.read(size).decode('utf-8'))
+    out, err, status = frames
+    if not status.isdigit():
+        print('The daemon has not finished the command', file=sys.stderr)
+        return 1
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+    return int(status)
+
+
+def run(ap, args, tl=None):
+    """Run the command given by parsed arguments.
+
+    The todo files are opened, unless a task list is given.
+    """
+    changes = args.add or args.add_from or args.mark or args.delete
+    if tl is None:
+        tl = open_lists(ap, args, changes)
+    from tasklist import InvalidIndexError
+    # IDs refer to the list from before the command, all changes are
+    # written at once or not at all
+    try:
+        if changes or args.update or args.archive is not None:
+            with tl.batch():
+                for words in args.add or []:
+                    tl.add(' '.join(words))
+                if args.add_from:
+                    for line in args.add_from:
+                        if line.strip():
+                            tl.add(line.strip())
+                for ref in args.mark or []:
+                    tl.mark(ref)
+                # delete from the end, so the remaining numbers do not shift
+                numbers = {tl.resolve(ref) for ref in args.delete or []}
+                for index in sorted(numbers, reverse=True):
+                    tl.delete(index)
+                if args.update:
+                    tl.update()
+                if args.archive is not None:
+                    tl.archive_tasks(args.archive)
+    except InvalidIndexError as err:
+        ap.error(err)
+    due = args.due_before or args.due_within is not None or args.overdue
+    since, before = due_range(args) if due else (None, None)
+    if args.list or ((args.search or due or args.include_archive) and
+                     not (args.comp or args.incomp)):
+        comp, incomp = True, True
     elif args.comp:
-        print(tl.list_tasks(incomp=False, status=args.status,
-                            number=args.number, sort=args.sorted))
+        comp, incomp = True, False
     elif args.incomp:
-        print(tl.list_tasks(comp=False, status=args.status,
-                            number=args.number, sort=args.sorted))
+        comp, incomp = False, True
+    else:
+        return
+    print_lines(tl.iter_lines(comp, incomp, status=args.status,
+                              number=args.number, sort=args.sorted,
+                              ids=args.ids, query=args.search, since=since,
+                              before=before, limit=args.limit,
+                              offset=args.offset,
+                              archived=args.include_archive))
 
 
-if __name__ == '__main__':
+def watch(ap, args):
+    """Give reminders of tasks of one list until interrupted."""
+    tl = open_lists(ap, args, False)
+    import scheduler
+    if args.watch_command:
+        sink = scheduler.CommandSink(args.watch_command)
+    else:
+        sink = scheduler.print_reminder
     try:
-        main()
-    except InvalidIndexError as err:
-        raise argparse.ArgumentParser.error(err)
+        scheduler.serve(scheduler.ReminderScheduler(
+            tl, [sink], state_path=scheduler.state_path_for(tl.tasks_path)))
+    except KeyboardInterrupt:
+        pass
+
+
+def open_lists(ap, args, changes):
+    """Return the task list of the command, TaskLists for many lists or
+    for none if the todo file does not exist yet and nothing is changed.
+    """
+    names = [cons.DEFAULT_LIST]
+    if args.list_name:
+        from lists import find_lists
+        try:
+            names = find_lists(args.list_name)
+        except ValueError as err:
+            ap.error(err)
+    if len(names) != 1:
+        if changes:
+            ap.error('tasks can be changed in one list at a time')
+        if args.watch:
+            ap.error('tasks can be watched in one list at a time')
+        from lists import TaskLists
+        return TaskLists([name for name in names
+                          if os.path.isfile(cons.list_file(name))])
+    path = cons.list_file(names[0])
+    # tasks added to a watched list later are reminded too
+    if changes or args.update or args.watch:
+        cons.create_conf(path)
+    elif not os.path.isfile(path):
+        # nothing has been added yet, commands show an empty list
+        from lists import TaskLists
+        return TaskLists([])
+    from tasklist import TaskListCLI
+    return TaskListCLI(path)
+
+
+def print_lines(lines):
+    """Print lines as they are made, an empty list as an empty line."""
+    from stats import STATS
+    empty = True
+    with STATS.timer('format'):
+        for line in lines:
+            # stdout is buffered, so lines are written in chunks
+            sys.stdout.write(line + '\n')
+            empty = False
+        if empty:
+            sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Encoding of tasks in JSON todo files.
+#
+# Version 1 files, written by older pytasks, are lists of task objects with
+# dates as cons.DATE_FORMAT strings. Version 2 files start with a header
+# object and keep tasks as arrays with dates as day ordinals (see
+# datetime.date.toordinal):
+#
+#     [{"version": 2}, ["buy milk", 739000, "month", false, 1], ...]
+#
+# Both versions are read, version 2 is written, so old files are upgraded
+# by the first write. JSON is handled by orjson or msgspec if one of them
+# is installed, otherwise by the json module.
+
+import gc
+import json
+import time
+import datetime
+import functools
+import itertools
+import contextlib
+
+import cons
+from task import Task
+from stats import STATS
+
+
+VERSION = 2
+
+# JSON library: name, loads, dumps and the error raised by loads
+_library = None
+
+
+class VersionError(Exception):
+    """Raised for files written by a newer pytasks, they are never read as
+    empty lists, which would be written over them.
+    """
+    pass
+
+
+def _get_library():
+    """Import the JSON library on first use, the fastest installed one or
+    the one named by cons.JSON_LIBRARY.
+    """
+    global _library
+    if _library is None:
+        if cons.JSON_LIBRARY:
+            # not a ValueError, which would make files read as empty
+            if cons.JSON_LIBRARY not in _LIBRARIES:
+                raise ImportError('Unknown JSON library \'{}\''.format(
+                    cons.JSON_LIBRARY))
+            _library = _LIBRARIES[cons.JSON_LIBRARY]()
+        else:
+            for name in ['orjson', 'msgspec']:
+                try:
+                    _library = _LIBRARIES[name]()
+                except ImportError:
+                    continue
+                break
+            else:
+                _library = _json()
+    return _library
+
+
+def _orjson():
+    import orjson
+    return ('orjson', orjson.loads,
+            lambda value: orjson.dumps(value).decode('utf-8'),
+            orjson.JSONDecodeError)
+
+
+def _msgspec():
+    import msgspec
+    decoder = msgspec.json.Decoder()
+    encoder = msgspec.json.Encoder()
+    return ('msgspec', decoder.decode,
+            lambda value: encoder.encode(value).decode('utf-8'),
+            msgspec.DecodeError)
+
+
+def _json():
+    return ('json', json.loads,
+            functools.partial(json.dumps, separators=(',', ':')), ValueError)
+
+
+_LIBRARIES = {'orjson': _orjson, 'msgspec': _msgspec, 'json': _json}
+
+
+def library():
+    """Return the name of the JSON library in use."""
+    return _get_library()[0]
+
+
+def loads(data):
+    """Decode JSON text, raise ValueError if it is invalid."""
+    name, loads, dumps, error = _get_library()
+    try:
+        return loads(data)
+    except error as err:
+        raise ValueError(str(err))
+
+
+def dumps(value):
+    """Encode a value as JSON text in one line."""
+    return _get_library()[2](value)
+
+
+@functools.lru_cache(maxsize=4096)
+def decode_date(text):
+    """Return the date written in cons.DATE_FORMAT (version 1 files).
+
+    Dates are cached, as strptime is slow and many tasks share them.
+    """
+    STATS.count('strptime')
+    return datetime.datetime.strptime(text, cons.DATE_FORMAT).date()
+
+
+def encode_task(task):
+    """Return the array of a task."""
+    return [task.text, task.date.toordinal() if task.date else None,
+            task.interval, task.done, task.id]
+
+
+def decode_task(record, dates=True):
+    """Convert a task array or a version 1 object to a Task object,
+    without its date if dates is False.
+    """
+    if isinstance(record, dict):
+        date = record['date']
+        return Task(record['text'],
+                    decode_date(date) if date and dates else None,
+                    record['interval'], record['done'], record.get('id'))
+    text, date, interval, done, task_id = record
+    return Task(text,
+                datetime.date.fromordinal(date) if date and dates else None,
+                interval, done, task_id)
+
+
+def _records(values):
+    """Return the version of the file and an iterator of its tasks."""
+    values = iter(values)
+    first = next(values, None)
+    if isinstance(first, dict) and 'version' in first:
+        if first['version'] != VERSION:
+            raise VersionError('Todo file version {} is not supported'.format(
+                first['version']))
+        return VERSION, values
+    if first is None:
+        return VERSION, values
+    return 1, itertools.chain([first], values)
+
+
+def decode_records(values, done=None, dates=True, decoded=False):
+    """Yield tasks of JSON values of a todo file, only ones with the status
+    if done is given, without dates if dates is False.
+
+    Values are taken and decoded cons.STREAM_BATCH_SIZE at a time, so the
+    time spent on each can be recorded as json_decode and task_decode,
+    once the tasks have been taken. If decoded is True, the values are
+    decoded from JSON already and taking them is not recorded.
+    """
+    fromordinal = datetime.date.fromordinal
+    json_time = task_time = 0.0
+    filtered = 0
+    try:
+        start = time.perf_counter()
+        version, records = _records(values)
+        while True:
+            batch = list(itertools.islice(records, cons.STREAM_BATCH_SIZE))
+            taken = time.perf_counter()
+            json_time += taken - start
+            if not batch:
+                return
+            filtered += len(batch)
+            if version == 1:
+                tasks = [decode_task(record, dates) for record in batch
+                         if done is None or record['done'] == done]
+            else:
+                tasks = [Task(text,
+                              fromordinal(date) if date and dates else None,
+                              interval, task_done, task_id)
+                         for text, date, interval, task_done, task_id in batch
+                         if done is None or task_done == done]
+            task_time += time.perf_counter() - taken
+            yield from tasks
+            start = time.perf_counter()
+    finally:
+        if not decoded:
+            STATS.add_time('json_decode', json_time)
+        STATS.add_time('task_decode', task_time)
+        STATS.count('tasks_filtered', filtered)
+
+
+def count_records(values, done=None):
+    """Return the number of tasks of JSON values of a todo file, only ones
+    with the status if done is given.
+    """
+    version, records = _records(values)
+    if done is None:
+        return sum(1 for record in records)
+    key = 'done' if version == 1 else 3
+    return sum(1 for record in records if record[key] == done)
+
+
+@contextlib.contextmanager
+def _paused_gc():
+    """Pause the garbage collector, which would otherwise scan objects of
+    a decoded file again and again while they are created, they have no
+    reference cycles anyway.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def decode_tasks(data):
+    """Decode a todo file, an empty or broken one gives an empty list."""
+    with _paused_gc():
+        try:
+            with STATS.timer('json_decode'):
+                values = loads(data)
+        except ValueError:
+            return []
+        return list(decode_records(values, decoded=True))
+
+
+def encode_tasks(tasks):
+    """Return a todo file with the tasks."""
+    with STATS.timer('json_encode'):
+        return dumps([{'version': VERSION}] +
+                     [encode_task(task) for task in tasks])
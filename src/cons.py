@@ -5,33 +5,76 @@
 import sys
 import os
 import os.path
-import datetime
 
 
 NAME = 'PyTasks'
-DATA_FILENAME = 'todo.txt'
-DATA_DIR = os.path.join(os.getenv('XDG_DATA_HOME'), NAME.lower())
+# a list named NAME is kept in NAME.txt, the default list is 'todo'
+LIST_EXT = '.txt'
+DEFAULT_LIST = 'todo'
+DATA_FILENAME = DEFAULT_LIST + LIST_EXT
+# an unset or empty XDG_DATA_HOME means the default from the XDG spec
+DATA_HOME = os.getenv('XDG_DATA_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.local', 'share')
+DATA_DIR = os.path.join(DATA_HOME, NAME.lower())
 DATA_FILE = os.path.join(DATA_DIR, DATA_FILENAME)
+# socket of the daemon serving the todo list (pytasks --daemon)
+SOCKET_FILE = os.path.join(DATA_DIR, 'daemon.sock')
 
-def create_conf():
-    """Create an empty todo list file."""
+
+def list_file(name):
+    """Return the path of the todo file of a named list."""
+    return os.path.join(DATA_DIR, name + LIST_EXT)
+
+
+def create_conf(path=None):
+    """Create an empty todo list file, DATA_FILE by default.
+
+    Nothing is done on import, the file is created before the first write.
+    """
+    path = path or DATA_FILE
     if not os.path.isdir(DATA_DIR):
         try:
-            os.mkdir(DATA_DIR)
+            os.makedirs(DATA_DIR)
         except OSError:
             print('\'{}\' cannot be created, file or symlink exists'.format(
                 DATA_DIR))
             sys.exit(1)
-    if not os.path.isfile(DATA_FILE):
+    if not os.path.isfile(path):
         try:
-            with open(DATA_FILE, 'w') as f:
+            with open(path, 'w') as f:
                 pass
         except IOError:
             print('\'{}\' cannot be created, dir or symlink exists'.format(
-                DATA_FILE))
+                path))
             sys.exit(1)
 
-create_conf()
+# storage backend of the todo file, see storage.BACKENDS
+STORAGE = os.getenv('PYTASKS_STORAGE', 'json')
+# JSON library of todo files (orjson, msgspec or json), the fastest
+# installed one if not set
+JSON_LIBRARY = os.getenv('PYTASKS_JSON')
+# size of the journal in bytes which triggers its compaction
+JOURNAL_COMPACT_SIZE = 64 * 1024
+# days after the date of a completed task when it is archived and whether
+# TaskParser.update() (e.g. pytasks --update) archives tasks
+ARCHIVE_AGE = 30
+ARCHIVE_ON_UPDATE = True
+# characters read at once when tasks are streamed from a JSON file and
+# tasks decoded at once from it
+READ_CHUNK_SIZE = 64 * 1024
+STREAM_BATCH_SIZE = 1024
+# seconds for which the GUI collects changes before writing them
+WRITE_DELAY = 0.5
+# milliseconds for which the GUI collects changes of the todo file made by
+# other programs and seconds between checks when they cannot be watched
+WATCH_DELAY = 100
+WATCH_POLL_INTERVAL = 1
+# hour of the day when pytasks --watch and the GUI remind of tasks due
+# that day and seconds after which they check the clock at the latest
+REMIND_HOUR = 9
+REMIND_MAX_WAIT = 60
+# tasks listed by one reminder of the GUI, others are only counted
+REMIND_MAX_TASKS = 10
 
 DATE_FORMAT = '%d.%m.%y'
 MONTH = 'month'
@@ -42,6 +85,8 @@ COLUMN_DONE = 1
 COLUMN_DATE = 2
 COLUMN_INTERVAL = 3
 COLUMN_TEXT = 4
+# number of tasks whose formatted cells are kept by the GUI
+MODEL_CACHE_SIZE = 1000
 
 COMBOBOX_INTERVAL_NONE = 0
 COMBOBOX_INTERVAL_MONTH = 1
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The daemon (pytasks --daemon) keeps the todo list loaded and serves
+# pytasks calls through a Unix socket (cons.SOCKET_FILE).
+#
+# Every message is a frame: its length as a 4-byte big-endian number and
+# the UTF-8 encoded data. A client sends one frame with the command line
+# arguments separated by NUL characters and receives three frames: the
+# standard output, the standard error and the exit status as a decimal
+# number. Then the connection is closed.
+
+
+import os
+import io
+import sys
+import signal
+import socket
+import datetime
+import traceback
+import contextlib
+import socketserver
+
+import cons
+import tasklist
+
+
+def read_frame(f):
+    """Return data of a frame read from the file or None at its end."""
+    header = f.read(4)
+    if len(header) < 4:
+        return None
+    size = int.from_bytes(header, 'big')
+    data = f.read(size)
+    if len(data) < size:
+        return None
+    return data
+
+
+def write_frame(f, data):
+    f.write(len(data).to_bytes(4, 'big') + data)
+
+
+class DaemonTaskList(tasklist.TaskListCLI):
+    """Task list which writes changes only when flush() is called, so the
+    daemon can answer a client before writing.
+
+    Every write is a full one, incremental changes of a storage would be
+    applied to a file without the changes which are not flushed yet.
+    """
+
+    def __init__(self, tasks_path, backend=None):
+        super(DaemonTaskList, self).__init__(tasks_path, backend)
+        self._unsaved = False
+
+    def _write(self, tasks):
+        if self._batch_depth:
+            super(DaemonTaskList, self)._write(tasks)
+            return
+        self._tasks = tasks
+        self._unsaved = True
+
+    def _store(self, method, *args):
+        self._write(self._tasks)
+
+    def flush(self):
+        """Write changes made since the last flush.
+
+        Exceptions raised by the write are passed to the caller, the
+        changes stay unsaved, so the next flush writes them again.
+        """
+        if self._unsaved:
+            super(DaemonTaskList, self)._write(self._tasks)
+            self._unsaved = False
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        data = read_frame(self.rfile)
+        if data is None:
+            return
+        argv = data.decode('utf-8').split('\0') if data else []
+        status, out, err = self.server.execute(argv)
+        for text in (out, err, str(status)):
+            write_frame(self.wfile, text.encode('utf-8'))
+
+
+class TaskServer(socketserver.UnixStreamServer):
+    """Server running pytasks commands on a loaded task list.
+
+    Requests are handled one by one, changes are written after the client
+    has got the answer.
+    """
+
+    def __init__(self, socket_path, tasks, ap, run):
+        """arguments:
+        socket_path -- path of the socket
+        tasks -- DaemonTaskList object
+        ap -- argparse.ArgumentParser of the CLI
+        run -- function running parsed arguments on a task list
+        """
+        self.tasks = tasks
+        self.ap = ap
+        self.run = run
+        # date of the last update of recurring tasks
+        self.updated = None
+        # whether the last write of changes has failed
+        self.flush_failed = False
+        super(TaskServer, self).__init__(socket_path, RequestHandler)
+
+    def execute(self, argv):
+        """Run a command, return its exit status, output and errors."""
+        today = datetime.date.today()
+        if self.updated != today:
+            self.tasks.update()
+            self.updated = today
+        out, err = io.StringIO(), io.StringIO()
+        status = 0
+        with contextlib.redirect_stdout(out), \
+                contextlib.redirect_stderr(err):
+            try:
+                args = self.ap.parse_args(argv)
+                if args.add_from or args.daemon or args.profile or \
+                        args.stats or args.list_name or args.watch:
+                    self.ap.error('option not supported by the daemon')
+                self.run(self.ap, args, self.tasks)
+            except SystemExit as exc:
+                status = exc.code if isinstance(exc.code, int) else 1
+            except Exception:
+                traceback.print_exc()
+                status = 1
+        return status, out.getvalue(), err.getvalue()
+
+    def service_actions(self):
+        # called by serve_forever() after every request and poll, so a
+        # failed write is tried again soon, it is reported only once
+        try:
+            self.tasks.flush()
+        except Exception as err:
+            if not self.flush_failed:
+                print('Tasks cannot be saved: {}'.format(err),
+                      file=sys.stderr)
+            self.flush_failed = True
+        else:
+            if self.flush_failed:
+                print('Tasks saved', file=sys.stderr)
+            self.flush_failed = False
+
+
+def serve(ap, run):
+    """Serve the todo list until the daemon is interrupted or terminated.
+
+    arguments:
+    ap -- argparse.ArgumentParser of the CLI
+    run -- function running parsed arguments on a task list
+    """
+    cons.create_conf()
+    if os.path.exists(cons.SOCKET_FILE):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(cons.SOCKET_FILE)
+        except OSError:
+            # left by a daemon which has not exited cleanly
+            os.remove(cons.SOCKET_FILE)
+        else:
+            print('The daemon is already running', file=sys.stderr)
+            sys.exit(1)
+        finally:
+            probe.close()
+    tasks = DaemonTaskList(cons.DATA_FILE)
+    # only the user can connect
+    umask = os.umask(0o077)
+    try:
+        server = TaskServer(cons.SOCKET_FILE, tasks, ap, run)
+    finally:
+        os.umask(umask)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        try:
+            tasks.flush()
+        finally:
+            server.server_close()
+            os.remove(cons.SOCKET_FILE)
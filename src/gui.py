@@ -5,10 +5,32 @@
 import sys
 import datetime
 
-from gi.repository import Gtk, Gdk
+from gi.repository import Gtk, Gdk, GLib
 
-import parser
+import writebehind
+import watch
+import scheduler
+import taskmodel
 import cons
+from task import Task
+
+
+# libnotify, imported on the first reminder, False if it is not installed
+_notify = None
+
+
+def _get_notify():
+    global _notify
+    if _notify is None:
+        try:
+            import gi
+            gi.require_version('Notify', '0.7')
+            from gi.repository import Notify
+        except (ImportError, ValueError):
+            _notify = False
+        else:
+            _notify = Notify if Notify.init(cons.NAME) else False
+    return _notify
 
 
 class GtkBuilderProxy:
@@ -54,22 +76,22 @@ class DialogAdd:
         builder.add_from_file(cons.DIALOG_ADD_SCHEMA)
         builder.connect_signals(self)
         self.widgets = GtkBuilderProxy(builder)
-        self.task = {'date': None, 'done': False}
+        self.task = Task()
 
     def run(self):
         """Return status and a task dictionary with user's description."""
         result = self.widgets.dialog.run()
-        self.task['text'] = self.widgets.entry_text.get_text()
+        self.task.text = self.widgets.entry_text.get_text()
         active = self.widgets.combobox_interval.get_active()
         if active == cons.COMBOBOX_INTERVAL_MONTH:
-            self.task['interval'] = cons.MONTH
+            self.task.interval = cons.MONTH
         elif active == cons.COMBOBOX_INTERVAL_YEAR:
-            self.task['interval'] = cons.YEAR
+            self.task.interval = cons.YEAR
         elif active == cons.COMBOBOX_INTERVAL_DAYS:
-            self.task['interval'] = \
+            self.task.interval = \
                     self.widgets.spinbutton_days.get_value_as_int()
         elif active == cons.COMBOBOX_INTERVAL_NONE:
-            self.task['interval'] = None
+            self.task.interval = None
         self.widgets.dialog.destroy()
         return result, self.task
 
@@ -91,18 +113,18 @@ class DialogAdd:
         if position == Gtk.EntryIconPosition.PRIMARY:
             # calendar icon clicked
             # define default date to show
-            _date = self.task['date'] if self.task['date'] else \
+            _date = self.task.date if self.task.date else \
                     datetime.date.today()
             dialog_calendar = DialogCalendar(_date)
             result_calendar, date = dialog_calendar.run()
             if result_calendar == Gtk.ResponseType.OK:
-                self.task['date'] = date
+                self.task.date = date
                 self.widgets.entry_date.set_text(date.strftime(cons.DATE_FORMAT))
                 # set combobox sensitive
                 self.widgets.combobox_interval.set_sensitive(True)
         else:
             # clear icon clicked
-            self.task['date'] = None
+            self.task.date = None
             self.widgets.entry_date.set_text('')
             # set combobox not sensitive
             self.widgets.combobox_interval.set_active(
@@ -146,13 +168,13 @@ class DialogEdit(DialogAdd):
 
     def set_values(self):
         """Fill proper widgets with task's values."""
-        self.widgets.entry_text.set_text(self.task['text'])
-        if self.task['date']:
-            self.widgets.entry_date.set_text(self.task['date'].strftime(
+        self.widgets.entry_text.set_text(self.task.text)
+        if self.task.date:
+            self.widgets.entry_date.set_text(self.task.date.strftime(
                 cons.DATE_FORMAT))
             # set combobox sensitive
             self.widgets.combobox_interval.set_sensitive(True)
-        interval = self.task['interval']
+        interval = self.task.interval
         if interval == cons.MONTH:
             self.widgets.combobox_interval.set_active(
                     cons.COMBOBOX_INTERVAL_MONTH)
@@ -179,12 +201,29 @@ class TaskListGUI:
         self.widgets = GtkBuilderProxy(builder)
         self.widgets.window.show_all()
 
-        self.parser = parser.TaskParser(cons.DATA_FILE)
+        cons.create_conf()
+        # changes are written by a background thread, its errors are shown
+        # by the main loop
+        self.parser = writebehind.WriteBehindParser(
+                cons.DATA_FILE,
+                on_error=lambda err: GLib.idle_add(self.show_error, err))
 
         # make done tasks strikethrough
         self.set_column_func()
-        # add tasks to the liststore object
-        self.liststore_update()
+        # rows are read from the parser only when they are shown
+        self.set_fixed_height()
+        self.model = taskmodel.TaskModel(self.parser)
+        self.widgets.treeview.set_model(self.model)
+        # show changes made by other programs, e.g. pytasks -a
+        self.watcher = watch.FileWatcher(self.parser.storage.files(),
+                                         self.on_tasks_changed)
+        # remind of tasks when their dates come, ones reminded before the
+        # last start are not reminded again
+        self.reminders = watch.ReminderTimer(
+                scheduler.ReminderScheduler(
+                    self.parser, [],
+                    state_path=scheduler.state_path_for(cons.DATA_FILE)),
+                self.remind)
 
     def set_column_func(self):
         """Add a function to treeview columns controlling strikethrough
@@ -208,52 +247,79 @@ class TaskListGUI:
                 make_strikethrough
         )
 
+    def set_fixed_height(self):
+        """Make all rows of the treeview as high as the first one.
+
+        Otherwise the treeview measures every row in the background, which
+        makes the model format all of them.
+        """
+        for column in self.widgets.treeview.get_columns():
+            column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+        self.widgets.treeviewcolumn_text.set_expand(True)
+        self.widgets.treeview.set_fixed_height_mode(True)
+
     def quit(self):
+        self.watcher.stop()
+        self.reminders.stop()
+        try:
+            self.parser.close()
+        except EnvironmentError as err:
+            print('Tasks cannot be saved: {}'.format(err), file=sys.stderr)
         Gtk.main_quit()
 
-    def liststore_update(self):
-        """Clear and add tasks to the liststore object."""
-        # count of tasks
-        self._index = 0
-        self.widgets.liststore.clear()
-        tasks = self.parser.get_tasks()
-        for task in tasks:
-            self.liststore_add_task(task)
-
-    def _get_date(self, date):
-        if date:
-            return date.strftime(cons.DATE_FORMAT)
-        return ''
-
-    def _get_interval(self, interval):
-        # FIXME: needs translating
-        if interval == cons.MONTH:
-            return 'miesiąc'
-        elif interval == cons.YEAR:
-            return 'rok'
-        elif isinstance(interval, int):
-            return '{} dni'.format(interval)
-        return ''
-
-    def liststore_add_task(self, task):
-        self.widgets.liststore.append([
-            self._index,
-            task['done'],
-            self._get_date(task['date']),
-            self._get_interval(task['interval']),
-            task['text']
-        ])
-        self._index += 1
-
-    def liststore_edit_task(self, it, task):
-        self.widgets.liststore.set_value(it,
-                cons.COLUMN_DATE, self._get_date(task['date']))
-        self.widgets.liststore.set_value(it,
-                cons.COLUMN_INTERVAL, self._get_interval(task['interval']))
-        self.widgets.liststore.set_value(it, cons.COLUMN_TEXT, task['text'])
+    def show_error(self, err):
+        """Show an error of writing tasks."""
+        dialog = Gtk.MessageDialog(
+                parent=self.widgets.window,
+                message_type=Gtk.MessageType.ERROR,
+                buttons=Gtk.ButtonsType.CLOSE,
+                text='Tasks cannot be saved')
+        dialog.format_secondary_text(str(err))
+        dialog.run()
+        dialog.destroy()
+        # called once by GLib.idle_add
+        return False
+
+    def remind(self, tasks):
+        """Show one reminder of tasks as a desktop notification or, without
+        libnotify, in a dialog.
+        """
+        lines = ['{} ({})'.format(task.text, taskmodel.format_date(task.date))
+                 for task in tasks[:cons.REMIND_MAX_TASKS]]
+        if len(tasks) > cons.REMIND_MAX_TASKS:
+            lines.append('and {} more'.format(
+                len(tasks) - cons.REMIND_MAX_TASKS))
+        text = '\n'.join(lines)
+        notify = _get_notify()
+        if notify:
+            notify.Notification.new(cons.NAME, text, None).show()
+            return
+        dialog = Gtk.MessageDialog(
+                parent=self.widgets.window,
+                message_type=Gtk.MessageType.INFO,
+                buttons=Gtk.ButtonsType.CLOSE,
+                text=text)
+        dialog.connect('response', lambda dialog, response: dialog.destroy())
+        dialog.show()
+
+    def on_tasks_changed(self):
+        # own writes and writes of the same content do not reload tasks
+        if self.parser.reload():
+            self.model.refresh()
+        self.reminders.on_files_changed()
+
+    def _index_of(self, task_id):
+        """Return the index of a task or None if another program has
+        deleted it, the model is refreshed then.
+        """
+        try:
+            return self.parser.index_of(task_id)
+        except KeyError:
+            self.model.refresh()
+            return None
 
     def add_task(self):
-        """Add a task to the liststore object and save to the file.
+        """Add a task to the model and save to the file.
         
         The method is using a dialog to get some values.
         """
@@ -261,22 +327,24 @@ class TaskListGUI:
         result, task = dialog_add.run()
         if result != Gtk.ResponseType.OK:
             return
-        self.liststore_add_task(task)
-        self.parser.add_task(**task)
+        self.model.add_task(task.text, task.date, task.interval, task.done)
 
     def edit_task(self):
         """Edit a selected task, similar to add_task."""
         model, it = self.widgets.treeview_selection.get_selected()
         if not it:
             return
-        index = model.get_value(it, cons.COLUMN_ID)
-        tasks = self.parser.get_tasks()
-        dialog_edit = DialogEdit(tasks[index])
+        task_id = model.get_value(it, cons.COLUMN_ID)
+        if self._index_of(task_id) is None:
+            return
+        dialog_edit = DialogEdit(self.parser.get_task_by_id(task_id))
         result, task = dialog_edit.run()
         if result != Gtk.ResponseType.OK:
             return
-        self.liststore_edit_task(it, task)
-        self.parser.edit_task(index, **task)
+        index = self._index_of(task_id)
+        if index is None:
+            return
+        self.model.edit_task(index, **task)
 
     def delete_task(self):
         """Delete a selected task confirmed by user using dialog."""
@@ -287,19 +355,23 @@ class TaskListGUI:
         result = dialog_delete.run()
         if result != Gtk.ResponseType.OK:
             return
-        index = model.get_value(it, cons.COLUMN_ID)
-        self.parser.delete_task(index)
-        self.liststore_update()
+        task_id = model.get_value(it, cons.COLUMN_ID)
+        index = self._index_of(task_id)
+        if index is None:
+            return
+        self.model.delete_task(index)
 
     def toggle_task(self):
         """Make a task done or not done."""
         model, it = self.widgets.treeview_selection.get_selected()
         if not it:
             return
-        index = model.get_value(it, cons.COLUMN_ID)
-        value = model.get_value(it, cons.COLUMN_DONE)
-        model.set_value(it, cons.COLUMN_DONE, not value)
-        self.parser.edit_task(index, done=not value)
+        task_id = model.get_value(it, cons.COLUMN_ID)
+        index = self._index_of(task_id)
+        if index is None:
+            return
+        self.model.edit_task(index,
+                             done=not model.get_value(it, cons.COLUMN_DONE))
 
     def _menu_set_sensitive(self, sensitive):
         """Set sensitive menuitems."""
@@ -334,6 +406,22 @@ class TaskListGUI:
     def on_toolbutton_done_clicked(self, button):
         self.toggle_task()
 
+    def _swap_rows(self, it, other_it):
+        """Swap two rows of the treeview and their tasks, the selection
+        follows the first one.
+        """
+        id_a = self.model.get_value(it, cons.COLUMN_ID)
+        id_b = self.model.get_value(other_it, cons.COLUMN_ID)
+        index_a, index_b = self._index_of(id_a), self._index_of(id_b)
+        if index_a is None or index_b is None:
+            return
+        self.model.swap_tasks(index_a, index_b)
+        try:
+            row = self.model.row_of(id_a)
+        except KeyError:
+            return
+        self.widgets.treeview_selection.select_path(Gtk.TreePath(row))
+
     def on_toolbutton_down_clicked(self, button):
         model, it = self.widgets.treeview_selection.get_selected()
         if not it:
@@ -341,29 +429,21 @@ class TaskListGUI:
         next_it = model.iter_next(it)
         if not next_it:
             next_it = model.get_iter_first()
-        model.swap(it, next_it)
-        index_a = model.get_value(it, cons.COLUMN_ID)
-        index_b = model.get_value(next_it, cons.COLUMN_ID)
-        model.set_value(it, cons.COLUMN_ID, index_b)
-        model.set_value(next_it, cons.COLUMN_ID, index_a)
-        self.parser.swap_task(index_a, index_b)
+        self._swap_rows(it, next_it)
 
     def on_toolbutton_up_clicked(self, button):
-        # FIXME doesn't work
-        return
         model, it = self.widgets.treeview_selection.get_selected()
         if not it:
             return
-        index_a = model.get_value(it, cons.COLUMN_ID)
-        index_b = -1
-        if index_a == 0:
-            index_b = len(model) - 1
-        else:
-            index_b = index_a - 1
-        model[index_a], model[index_b] = model[index_b], model[index_a]
-        model[index_a][cons.COLUMN_ID] = index_b
-        model[index_b][cons.COLUMN_ID] = index_a
-        self.parser.swap_task(index_a, index_b)
+        previous_it = model.iter_previous(it)
+        if not previous_it:
+            previous_it = model.iter_nth_child(None, len(model) - 1)
+        self._swap_rows(it, previous_it)
+
+    def on_searchentry_search_changed(self, entry):
+        # a new model is faster than removing most rows of the old one
+        self.model = taskmodel.TaskModel(self.parser, entry.get_text())
+        self.widgets.treeview.set_model(self.model)
 
     def on_context_menuitem_add_activate(self, menuitem):
         self.add_task()
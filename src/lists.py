@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import glob
+import heapq
+import itertools
+import contextlib
+
+import cons
+import tasklist
+from stats import STATS
+
+
+def find_lists(patterns):
+    """Return sorted names of lists matching the names or shell patterns,
+    e.g. 'work' or 'project-*'.
+
+    A name without wildcards is returned even if its list does not exist
+    yet, a pattern gives only existing lists.
+    """
+    names = set()
+    for pattern in patterns:
+        if os.sep in pattern or pattern.endswith(cons.LIST_EXT):
+            raise ValueError('\'{}\' is not a list name'.format(pattern))
+        if any(char in pattern for char in '*?['):
+            paths = glob.glob(cons.list_file(pattern))
+            names.update(os.path.basename(path)[:-len(cons.LIST_EXT)]
+                         for path in paths if os.path.isfile(path))
+        else:
+            names.add(pattern)
+    return sorted(names)
+
+
+def _get_date(pair):
+    return pair[1].date
+
+
+def _select_tasks(cls, path, backend, args):
+    # run by worker processes, which open lists on their own
+    return cls(path, backend).select_tasks(*args)
+
+
+class TaskLists:
+    """Several named todo lists shown as one.
+
+    Every list has its own parser, storage and caches, so each one is
+    read, updated and written on its own and a big list does not slow down
+    the others. Tasks are selected from the lists in a process pool, as
+    decoding holds the GIL, and merged, by date when they are sorted.
+    """
+
+    def __init__(self, names, cls=tasklist.TaskListCLI, backend=None):
+        """arguments:
+        names -- names of existing lists
+        cls -- class of the parsers of the lists
+        backend -- name of the storage backend (see storage.BACKENDS)
+        """
+        self.names = list(names)
+        self.cls = cls
+        self.backend = backend
+        self._parsers = None
+
+    def get_parsers(self):
+        """Return parsers of the lists, opened on the first call."""
+        if self._parsers is None:
+            self._parsers = [self.cls(cons.list_file(name), self.backend)
+                             for name in self.names]
+        return self._parsers
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Apply changes to all lists and write each of them once, see
+        TaskParser.batch.
+        """
+        with contextlib.ExitStack() as stack:
+            for parser in self.get_parsers():
+                stack.enter_context(parser.batch())
+            yield self
+
+    def update(self):
+        """Update recurring tasks of every list, see TaskParser.update."""
+        for parser in self.get_parsers():
+            parser.update()
+
+    def archive_tasks(self, age=None):
+        """Archive old completed tasks of every list, return their number,
+        see TaskParser.archive_tasks.
+        """
+        return sum(parser.archive_tasks(age) for parser in self.get_parsers())
+
+    def _select(self, args):
+        """Return tasks selected from every list by select_tasks called
+        with the arguments.
+        """
+        workers = min(len(self.names), os.cpu_count() or 1)
+        if workers < 2:
+            return [parser.select_tasks(*args)
+                    for parser in self.get_parsers()]
+        # imported here, so commands on one list do not pay for it
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(workers) as pool:
+            return list(pool.map(_select_tasks, itertools.repeat(self.cls),
+                                 map(cons.list_file, self.names),
+                                 itertools.repeat(self.backend),
+                                 itertools.repeat(args)))
+
+    def select_tasks(self, comp=True, incomp=True, sort=False, query=None,
+                     since=None, before=None, limit=None, offset=0,
+                     archived=False):
+        """Return a list of list names and copies of chosen tasks.
+
+        Arguments are the same as of TaskParser.select_tasks. Tasks are
+        taken list by list, sorted ones are merged by dates, tasks with
+        equal dates keep the order of the lists.
+        """
+        stop = None if limit is None else offset + limit
+        with STATS.timer('select_lists'):
+            selected = self._select((comp, incomp, sort, query, since,
+                                     before, stop, 0, archived))
+        pairs = [[(name, task) for task in tasks]
+                 for name, tasks in zip(self.names, selected)]
+        if sort or since is not None or before is not None:
+            merged = heapq.merge(*pairs, key=_get_date)
+        else:
+            merged = itertools.chain.from_iterable(pairs)
+        return list(itertools.islice(merged, offset, stop))
+
+    def list_tasks(self, *args, **kwargs):
+        """Return a formatted string with tasks of all lists, arguments are
+        the same as of TaskListCLI.list_tasks.
+        """
+        lines = self.iter_lines(*args, **kwargs)
+        with STATS.timer('format'):
+            return '\n'.join(lines)
+
+    def iter_lines(self, comp=True, incomp=True, status=True, number=True,
+                   sort=False, ids=False, query=None, since=None,
+                   before=None, limit=None, offset=0, archived=False):
+        """Return an iterator of lines showing tasks of all lists, every
+        one with the name of its list, see TaskListCLI.iter_lines.
+        """
+        pairs = self.select_tasks(comp, incomp, sort, query, since, before,
+                                  limit, offset, archived)
+        lines = tasklist.format_lines((task for name, task in pairs),
+                                      status, False, ids)
+        lines = ('{}: {}'.format(name, line)
+                 for (name, task), line in zip(pairs, lines))
+        if number:
+            lines = ('{}. {}'.format(n, line)
+                     for n, line in enumerate(lines, offset + 1))
+        return lines
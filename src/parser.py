@@ -3,60 +3,601 @@
 
 
 import os.path
-import json
+import time
 import datetime
+import contextlib
+import bisect
+import heapq
+import itertools
 import operator
 
 import cons
+import storage
+import archive
+import recurrence
+import search
+from task import Task
+from stats import STATS
 
 
 class NoFileError(Exception):
     pass
 
 
+_get_date = operator.attrgetter('date')
+
+
 class TaskParser:
 
-    def __init__(self, tasks_path):
+    def __init__(self, tasks_path, backend=None):
+        """arguments:
+        tasks_path -- path of the todo file
+        backend -- name of the storage backend (see storage.BACKENDS),
+            cons.STORAGE by default
+        """
         if os.path.isfile(tasks_path):
             self.tasks_path = tasks_path
         else:
             raise NoFileError('Given file \'{}\' does not exist'.format(
                 os.path.split(tasks_path)[1]))
-        # update tasks with defined interval
-        self.update()
+        self.storage = storage.open_storage(tasks_path, backend)
+        # decoded tasks and the storage signature they were read with
+        self._tasks = None
+        self._signature = None
+        # nesting level of batch() and whether the batch changed tasks
+        self._batch_depth = 0
+        self._dirty = False
+        # whether cached tasks have changes which are not saved yet, i.e.
+        # dates moved by recurrence or new IDs
+        self._pending = False
+        # date on which recurring dates of the cached tasks have been
+        # checked, if the storage has not been marked as updated then
+        # (see Storage.set_updated)
+        self._checked = None
+        # ID -> task, ID -> index (None until needed), the next free ID
+        # and whether IDs of archived tasks are above it
+        self._index = {}
+        self._positions = None
+        self._next_id = 1
+        self._archived_ids = True
+        # ordinals of dates and tasks with them sorted by dates, made when
+        # needed, and whether tasks with equal dates may be out of order
+        self._date_keys = None
+        self._by_date = None
+        self._date_ties = False
+        # stamp of the storage files (see Storage.stamp()) from the last
+        # read or write and texts which changed tasks have in them (None
+        # for new tasks), None when all tasks have been replaced
+        self._stamp = None
+        self._changed = {}
+        # search index, opened when it exists or is needed
+        self._search = None
+        # archive of completed tasks, opened when needed, and tasks moved
+        # out of the list which are archived by the next write
+        self._archive = None
+        self._archived = []
+        # counters and timings, shared by all parsers (see stats.Stats)
+        self.stats = STATS
+
+    def _load(self):
+        """Return the cached list of tasks.
+
+        The storage is read again only when its modification time, size or
+        inode has changed since the last read or write. Dates of overdue
+        tasks with an interval are moved in memory, unless the storage has
+        already been updated today.
+        """
+        if self._batch_depth and self._tasks is not None:
+            return self._tasks
+        signature = self.storage.signature()
+        if self._tasks is None or signature != self._signature:
+            # taken before reading, so a change in the meantime is noticed
+            self._stamp = self.storage.stamp()
+            self._changed = {}
+            with STATS.timer('load'):
+                tasks = self.storage.load()
+            self._pending = self._index_tasks(tasks)
+            self._checked = None
+            today = datetime.date.today()
+            if self.storage.get_updated() != today:
+                with STATS.timer('recurrence'):
+                    if recurrence.advance_tasks(tasks, today):
+                        self._pending = True
+                self._checked = today
+            self._tasks = tasks
+            self._signature = signature
+            self._by_date = None
+        else:
+            STATS.count('cache_hits')
+        return self._tasks
+
+    def _index_tasks(self, tasks):
+        """Give IDs to tasks without them and build the ID index.
+
+        Return True if any task got a new ID.
+        """
+        self._index = {}
+        self._positions = None
+        self._next_id = max([task.id for task in tasks
+                             if task.id is not None] or [0]) + 1
+        self._archived_ids = True
+        changed = False
+        for task in tasks:
+            if task.id is None or task.id in self._index:
+                task.id = self._new_id()
+                changed = True
+            self._index[task.id] = task
+        return changed
+
+    def _new_id(self):
+        """Return a free ID, IDs of archived tasks are not given again."""
+        if self._archived_ids:
+            # only headers of the archive are read, once after a load
+            self._next_id = max(self._next_id,
+                                self._get_archive().next_id())
+            self._archived_ids = False
+        task_id = self._next_id
+        self._next_id += 1
+        return task_id
+
+    def _write(self, tasks):
+        """Write all tasks and keep them as the cached list."""
+        self._tasks = tasks
+        if self._batch_depth:
+            self._dirty = True
+            return
+        if self._archived:
+            # before the list, so archived tasks are never lost
+            with STATS.timer('archive'):
+                self._get_archive().append(self._archived)
+            self._archived = []
+        with STATS.timer('save'):
+            self.storage.save(tasks)
+        self._mark_updated(self._pending)
+        self._signature = self.storage.signature()
+        self._written()
+
+    def _store(self, method, *args):
+        """Pass a change of the cached list to a storage method.
+
+        During a batch the change is only remembered. Pending changes make
+        the whole list written.
+        """
+        if self._batch_depth:
+            self._dirty = True
+            return
+        if self._pending:
+            self._write(self._tasks)
+            return
+        with STATS.timer('store'):
+            method(self._tasks, *args)
+        self._mark_updated(False)
+        self._signature = self.storage.signature()
+        self._written()
+
+    def _mark_updated(self, pending):
+        """Mark the storage as updated today after a write, if written tasks
+        had pending changes or their dates were checked today, so later
+        reads skip the recurrence pass and may query the storage.
+        """
+        today = datetime.date.today()
+        if pending or self._checked == today:
+            self.storage.set_updated(today)
+        self._pending = False
+        self._checked = None
+
+    def _written(self):
+        """Pass changes of texts to the search index after a write."""
+        stamp, self._stamp = self._stamp, self.storage.stamp()
+        changed, self._changed = self._changed, {}
+        self._update_index(changed, stamp, self._index)
+
+    def _update_index(self, changed, stamp, written):
+        """Update the search index, if there is one, after a write.
+
+        arguments:
+        changed -- texts of changed tasks before the write (see _changed)
+        stamp -- stamp of the storage files before the write
+        written -- written tasks by IDs
+        """
+        index = self._open_index()
+        if index is None:
+            return
+        with STATS.timer('index'):
+            if changed is None:
+                index.invalidate()
+                return
+            index.update(((task_id, text, written[task_id].text
+                           if task_id in written else None)
+                          for task_id, text in changed.items()),
+                         stamp, self._stamp)
+
+    def _open_index(self, create=False):
+        """Return the search index or None if it does not exist."""
+        if self._search is None:
+            path = search.SearchIndex.path_for(self.tasks_path)
+            if not (create or os.path.exists(path)):
+                return None
+            self._search = search.SearchIndex(path)
+        return self._search
+
+    def _get_archive(self):
+        if self._archive is None:
+            self._archive = archive.Archive(
+                archive.Archive.path_for(self.tasks_path))
+        return self._archive
+
+    def _changing(self, task_id, text):
+        """Remember the text of a task before its first change."""
+        if self._changed is not None:
+            self._changed.setdefault(task_id, text)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Apply many changes to tasks and write them once.
+
+        Tasks are loaded when the block is entered and written on exit if
+        anything changed. Batches can be nested, the outermost one writes
+        and its changes are discarded when an exception leaves it.
+
+            with parser.batch():
+                parser.add_task('one')
+                parser.delete_task(0)
+        """
+        self._load()
+        self._batch_depth += 1
+        completed = False
+        try:
+            yield self
+            completed = True
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                dirty, self._dirty = self._dirty, False
+                if not completed:
+                    # drop the changes, the storage will be read again
+                    self._tasks = None
+                    self._archived = []
+                elif dirty:
+                    self._write(self._tasks)
+
+    transaction = batch
 
     def get_tasks(self):
         """Return a list with tasks.
 
-        If file is empty return an empty list.
+        If file is empty return an empty list. The tasks are copies, so
+        changing them does not affect the parser.
+        """
+        return [task.copy() for task in self._load()]
+
+    def get_tasks_view(self):
+        """Return a tuple with the tasks kept by the parser.
+
+        Unlike get_tasks nothing is copied, so the tasks must not be
+        changed.
+        """
+        return tuple(self._load())
+
+    def get_task(self, index):
+        """Return a copy of a task pointed by the index."""
+        return self._load()[index].copy()
+
+    def get_task_by_id(self, task_id):
+        """Return a copy of a task with the ID.
+
+        Raise KeyError if there is no such task.
+        """
+        self._load()
+        return self._index[task_id].copy()
+
+    def index_of(self, task_id):
+        """Return the index of a task with the ID.
+
+        Raise KeyError if there is no such task.
         """
-        with open(self.tasks_path) as f:
-            try:
-                tasks = json.load(f)
-            except ValueError:
-                return []
+        return self._get_positions()[task_id]
+
+    def _get_positions(self):
+        tasks = self._load()
+        if self._positions is None:
+            self._positions = {task.id: i for i, task in enumerate(tasks)}
+        return self._positions
+
+    def count_tasks(self, done=None):
+        """Return the number of tasks, only ones with the status if done is
+        given.
+
+        Tasks which are not loaded are counted by the storage without
+        decoding them.
+        """
+        if self._tasks is None:
+            return self.storage.count(done)
+        tasks = self._load()
+        if done is None:
+            return len(tasks)
+        return sum(1 for task in tasks if task.done == done)
+
+    def iter_tasks(self, done=None, fields=None):
+        """Yield copies of tasks one by one.
+
+        arguments:
+        done -- status of yielded tasks, None for any
+        fields -- names of task attributes, e.g. ('id', 'text'), tuples of
+            their values are yielded instead of tasks
+
+        Tasks which are not loaded are read from the storage as they are
+        taken, so a big list is never held in memory, and dates are decoded
+        only for tasks with the status and when they are among the fields.
+        """
+        if fields is not None:
+            fields = tuple(fields)
+        dates = fields is None or 'date' in fields
+        if self._tasks is None:
+            tasks = self.storage.iter_tasks(done, dates)
+            first = next(tasks, None)
+            # tasks written by old versions get IDs when they are loaded
+            if first is None or first.id is not None:
+                today = datetime.date.today()
+                if self.storage.get_updated() == today:
+                    today = None
+                # recorded once the tasks have been taken
+                recurrence_time = 0.0
+                streamed = 0
+                try:
+                    for task in itertools.chain([first] if first else [],
+                                                tasks):
+                        if today and task.date and task.interval:
+                            start = time.perf_counter()
+                            task.date = recurrence.next_occurrence(
+                                task.date, task.interval, today)
+                            recurrence_time += time.perf_counter() - start
+                        streamed += 1
+                        yield task if fields is None else \
+                            tuple(getattr(task, name) for name in fields)
+                finally:
+                    if today:
+                        STATS.add_time('recurrence', recurrence_time)
+                    STATS.count('tasks_streamed', streamed)
+                return
+            tasks.close()
+        for task in self.get_tasks_view():
+            if done is None or task.done == done:
+                yield task.copy() if fields is None else \
+                    tuple(getattr(task, name) for name in fields)
+
+    def iter_archived(self, fields=None):
+        """Yield archived tasks one by one, see archive_tasks.
+
+        The archive is read as tasks are taken, fields are the same as of
+        iter_tasks.
+        """
+        if fields is not None:
+            fields = tuple(fields)
+        dates = fields is None or 'date' in fields
+        for task in self._get_archive().iter_tasks(dates):
+            yield task if fields is None else \
+                tuple(getattr(task, name) for name in fields)
+
+    def search(self, query):
+        """Return a set of IDs of tasks found by the query.
+
+        A task is found if every word of the query begins a word of its
+        text, case is ignored, e.g. 'buy mil' finds 'Buy milk'. Return None
+        if the query has no words.
+
+        Tasks are found by the search index (see search.SearchIndex), which
+        is made on the first search and kept up to date by later changes.
+        """
+        words = search.split_words(query)
+        if not words:
+            return None
+        with STATS.timer('search'):
+            index = self._open_index(create=True)
+            if self._tasks is None and \
+                    index.stamp() == self.storage.stamp():
+                # nothing is read or changed yet
+                return index.search(words)
+            tasks = self._load()
+            if self._changed is None or index.stamp() != self._stamp:
+                self._rebuild_index(index, tasks)
+            ids = index.search(words)
+            if self._changed is not None:
+                # the index has texts from the storage
+                for task_id in self._changed:
+                    ids.discard(task_id)
+                    task = self._index.get(task_id)
+                    if task is not None and search.matches(words, task.text):
+                        ids.add(task_id)
+            return ids
+
+    def _rebuild_index(self, index, tasks):
+        """Make the index for the storage files, tasks are the loaded ones.
+
+        Changes which are not written yet are left out, texts of changed
+        tasks are taken from _changed. When all tasks have been replaced,
+        the index is made for them and the write makes it rebuilt again.
+        """
+        texts = {task.id: task.text for task in tasks}
+        if self._changed is None:
+            stamp = None
+        else:
+            stamp = self._stamp
+            for task_id, text in self._changed.items():
+                if text is None:
+                    texts.pop(task_id, None)
+                else:
+                    texts[task_id] = text
+        index.rebuild(texts.items(), stamp)
+
+    def _date_index(self):
+        """Return ordinals of dates and tasks with them sorted by dates.
+
+        The index is made on the first use and kept up to date by changes
+        of tasks. Tasks with equal dates are in the order of the list.
+        """
+        tasks = self._load()
+        if self._by_date is None:
+            with STATS.timer('date_index'):
+                # the sort is stable, so equal dates keep the order
+                self._by_date = sorted((task for task in tasks if task.date),
+                                       key=_get_date)
+                self._date_keys = [task.date.toordinal()
+                                   for task in self._by_date]
+            self._date_ties = False
+        elif self._date_ties:
+            # dates have not changed, so the keys are still valid
+            positions = self._get_positions()
+            self._by_date.sort(key=lambda task: (task.date,
+                                                 positions[task.id]))
+            self._date_ties = False
+        return self._date_keys, self._by_date
+
+    def _index_date(self, task):
+        """Put a dated task in the date index, if it has been made."""
+        if self._by_date is None or not task.date:
+            return
+        key = task.date.toordinal()
+        i = bisect.bisect_right(self._date_keys, key)
+        self._date_keys.insert(i, key)
+        self._by_date.insert(i, task)
+        if i and self._date_keys[i - 1] == key and \
+                task is not self._tasks[-1]:
+            # only the last task of the list surely follows the others
+            self._date_ties = True
+
+    def _moved_date(self, task):
+        """Note a task moved in the list, tasks with the same date may be
+        out of order in the date index then.
+        """
+        if self._by_date is None or not task.date:
+            return
+        key = task.date.toordinal()
+        start = bisect.bisect_left(self._date_keys, key)
+        if start + 1 < len(self._date_keys) and \
+                self._date_keys[start + 1] == key:
+            self._date_ties = True
+
+    def _unindex_date(self, task, date):
+        """Remove a task which had the date from the date index."""
+        if self._by_date is None or not date:
+            return
+        i = bisect.bisect_left(self._date_keys, date.toordinal())
+        while self._by_date[i] is not task:
+            i += 1
+        del self._date_keys[i]
+        del self._by_date[i]
+
+    def _date_range(self, since, before):
+        """Return tasks with dates in the range sorted by them, None for
+        either bound means no limit.
+        """
+        keys, tasks = self._date_index()
+        start = 0 if since is None else \
+            bisect.bisect_left(keys, since.toordinal())
+        end = len(keys) if before is None else \
+            bisect.bisect_left(keys, before.toordinal(), start)
+        return tasks[start:end]
+
+    def select_tasks(self, comp=True, incomp=True, sort=False, query=None,
+                     since=None, before=None, limit=None, offset=0,
+                     archived=False):
+        """Return a list with copies of chosen tasks.
+
+        arguments:
+        comp -- return completed tasks
+        incomp -- return incompleted tasks
+        sort -- return only tasks with a date, sorted by it
+        query -- return only tasks found by the query (see search)
+        since -- return only tasks with a date on or after it (sorted)
+        before -- return only tasks with a date before it (sorted)
+        limit -- return at most this number of tasks
+        offset -- skip this number of chosen tasks first
+        archived -- choose completed tasks of the archive too, they come
+            before the ones of the list and before tasks with equal dates
+
+        If the tasks are not loaded yet and the storage is up to date, the
+        storage filters them itself, e.g. using database indexes. Loaded
+        tasks are sorted and ranges of dates found by the date index, the
+        first few sorted tasks by a heap if the index is not made yet.
+        """
+        if not (comp or incomp) or limit == 0:
+            return []
+        dated = sort or since is not None or before is not None
+        stop = None if limit is None else offset + limit
+        if archived and comp:
+            tasks = self.select_tasks(comp, incomp, sort, query, since,
+                                      before, stop)
+            old = self._select_archived(dated, query, since, before, stop)
+            if dated:
+                merged = heapq.merge(old, tasks, key=_get_date)
             else:
-                for i, task in enumerate(tasks):
-                    if not task['date']:
-                        continue
-                    date = datetime.datetime.strptime(task['date'],
-                            cons.DATE_FORMAT)
-                    date = datetime.date(date.year, date.month, date.day)
-                    tasks[i]['date'] = date
-                return tasks
+                merged = itertools.chain(old, tasks)
+            return list(itertools.islice(merged, offset, stop))
+        done = None if comp and incomp else comp
+        ids = self.search(query) if query else None
+        if self._tasks is None and \
+                self.storage.get_updated() == datetime.date.today():
+            with STATS.timer('query'):
+                if ids is None:
+                    selected = self.storage.query(done, dated, since, before,
+                                                  limit, offset)
+                else:
+                    selected = self.storage.query(done, dated, since, before)
+            if selected is not None:
+                if ids is not None:
+                    selected = [task for task in selected
+                                if task.id in ids][offset:stop]
+                STATS.count('tasks_selected', len(selected))
+                return selected
+        heap = dated and stop is not None and self._by_date is None
+        if heap:
+            chosen = (task for task in self._load() if task.date
+                      if since is None or task.date >= since
+                      if before is None or task.date < before)
+        elif dated:
+            chosen = self._date_range(since, before)
+        else:
+            chosen = self._load()
+        chosen = (task for task in chosen
+                  if done is None or task.done == done
+                  if ids is None or task.id in ids)
+        if heap:
+            # equal dates keep the order, as in a stable sort
+            chosen = heapq.nsmallest(stop, chosen, key=_get_date)
+        tasks = [task.copy()
+                 for task in itertools.islice(chosen, offset, stop)]
+        STATS.count('tasks_selected', len(tasks))
+        return tasks
+
+    def _select_archived(self, dated, query, since, before, stop):
+        """Return the first stop archived tasks chosen as by select_tasks,
+        all of them if stop is None, sorted by dates if dated is set.
+        """
+        words = search.split_words(query) if query else None
+        chosen = (task for task in self.iter_archived()
+                  if not words or search.matches(words, task.text)
+                  if not dated or task.date
+                  if since is None or task.date >= since
+                  if before is None or task.date < before)
+        if not dated:
+            return list(itertools.islice(chosen, stop))
+        if stop is None:
+            return sorted(chosen, key=_get_date)
+        return heapq.nsmallest(stop, chosen, key=_get_date)
 
     def save_tasks(self, tasks):
         """Save tasks in the file.
 
-        The file is being cleaned and written with the tasks list.
+        The file is being cleaned and written with the tasks list. Given
+        tasks (Task objects or dictionaries) are not modified.
         """
-        with open(self.tasks_path, 'w') as f:
-            for i, task in enumerate(tasks):
-                if task['date']:
-                    # convert date from datetime.date object
-                    # to a formatted string
-                    tasks[i]['date'] = task['date'].strftime(cons.DATE_FORMAT)
-            json.dump(tasks, f)
+        tasks = [Task.from_dict(task) for task in tasks]
+        if self._index_tasks(tasks):
+            self._pending = True
+        self._changed = None
+        self._by_date = None
+        self._write(tasks)
 
     def add_task(self, text=None, date=None, interval=None, done=False):
         """Add a task and save in the todo file.
@@ -67,76 +608,138 @@ class TaskParser:
         interval -- possible values: number of days, 'month' (cons.MONTH)
             or 'year' (cons.YEAR)
         done -- status of the task (by default False)
+
+        Return the ID of the new task.
         """
-        tasks = self.get_tasks()
-        tasks.append({
-            'text': text,
-            'date': date,
-            'interval': interval,
-            'done': done
-        })
-        self.save_tasks(tasks)
+        tasks = self._load()
+        if date and interval:
+            date = recurrence.next_occurrence(date, interval)
+        task = Task(text, date, interval, done, self._new_id())
+        tasks.append(task)
+        self._index[task.id] = task
+        if self._positions is not None:
+            self._positions[task.id] = len(tasks) - 1
+        self._changing(task.id, None)
+        self._index_date(task)
+        self._store(self.storage.add, task)
+        return task.id
 
     def delete_task(self, index):
         """Delete a task pointed by the index."""
-        tasks = self.get_tasks()
-        del tasks[index]
-        self.save_tasks(tasks)
+        tasks = self._load()
+        task = tasks.pop(index)
+        del self._index[task.id]
+        self._changing(task.id, task.text)
+        self._unindex_date(task, task.date)
+        # indexes of the following tasks have changed
+        self._positions = None
+        self._store(self.storage.delete, index, task)
 
     def edit_task(self, index, **task):
         """Edit a task pointed by the index.
         Similar to add_task method.
         """
-        tasks = self.get_tasks()
+        edited = self._load()[index]
+        date = edited.date
         # dirty solution
         if task.get('text', -1) != -1:
-            tasks[index]['text'] = task['text']
+            self._changing(edited.id, edited.text)
+            edited.text = task['text']
         if task.get('date', -1) != -1:
-            tasks[index]['date'] = task['date']
+            edited.date = task['date']
         if task.get('interval', -1) != -1:
-            tasks[index]['interval'] = task['interval']
+            edited.interval = task['interval']
         if task.get('done') in (False, True):
-            tasks[index]['done'] = task['done']
-        self.save_tasks(tasks)
+            edited.done = task['done']
+        if edited.date and edited.interval:
+            edited.date = recurrence.next_occurrence(edited.date,
+                                                     edited.interval)
+        if edited.date != date:
+            self._unindex_date(edited, date)
+            self._index_date(edited)
+        self._store(self.storage.edit, index, edited)
 
     def swap_task(self, index_a, index_b):
         """Move a task from an index to another one."""
-        tasks = self.get_tasks()
+        tasks = self._load()
         tasks[index_a], tasks[index_b] = tasks[index_b], tasks[index_a]
-        self.save_tasks(tasks)
+        if self._positions is not None:
+            self._positions[tasks[index_a].id] = index_a
+            self._positions[tasks[index_b].id] = index_b
+        self._moved_date(tasks[index_a])
+        self._moved_date(tasks[index_b])
+        self._store(self.storage.swap, index_a, index_b)
 
     def update(self):
         """Update tasks with specified interval option.
-        
-        Basically this method updates date param when interval is set.
-        """
-        tasks = self.get_tasks()
-        for i, task in enumerate(tasks):
-            if not (task['date'] and task['interval']):
-                continue
-            date = task['date']
-            interval = task['interval']
-            while (datetime.date.today() - date).days > 0:
-                if isinstance(interval, int):
-                    date += datetime.timedelta(days=interval)
-                elif interval == cons.MONTH:
-                    if date.month == 12:
-                        date = date.replace(year=date.year + 1, month=1)
-                    else:
-                        # fix for february and 30 days months
-                        day = date.day
-                        while True:
-                            try:
-                                date = date.replace(month=date.month + 1,
-                                                    day=day)
-                            except ValueError:
-                                day -= 1
-                            else:
-                                break
-                elif interval == cons.YEAR:
-                    date = date.replace(year=date.year + 1)
-                tasks[i]['date'] = date
-        self.save_tasks(tasks)
+
+        Basically this method moves the date of overdue tasks with an
+        interval to their next occurrence on or after today. Old completed
+        tasks are moved to the archive too, unless cons.ARCHIVE_ON_UPDATE
+        is not set, see archive_tasks. Completed tasks without a date are
+        left in the list, their age is not known. Tasks are written only
+        if any of them has been moved.
+
+        Reading tasks updates them in memory anyway, so there is no need to
+        call this method before using the parser.
+        """
+        with STATS.timer('update'):
+            tasks = self._load()
+            if recurrence.advance_tasks(tasks):
+                self._pending = True
+                self._by_date = None
+            archived = cons.ARCHIVE_ON_UPDATE and \
+                self._move_archived(tasks, cons.ARCHIVE_AGE, False)
+            if self._pending or archived:
+                self._write(tasks)
+            elif self.storage.get_updated() != datetime.date.today():
+                # nothing has moved, the storage is up to date as it is
+                self._mark_updated(False)
+
+    def archive_tasks(self, age=None):
+        """Move old completed tasks to the archive (see archive.Archive).
+
+        Completed tasks without an interval are moved if they have no date
+        or it is more than age days ago, cons.ARCHIVE_AGE by default. The
+        archive is written before the list, so a failed write may leave
+        tasks in both of them, but never in neither.
+
+        Return the number of moved tasks.
+        """
+        if age is None:
+            age = cons.ARCHIVE_AGE
+        tasks = self._load()
+        moved = self._move_archived(tasks, age)
+        if moved:
+            self._write(tasks)
+        return moved
+
+    def _move_archived(self, tasks, age, undated=True):
+        """Remove tasks to be archived from the list, they are archived
+        by the next write. Return their number.
+
+        Completed tasks without a date are archived only if undated is
+        True.
+        """
+        cutoff = datetime.date.today() - datetime.timedelta(days=age)
+        kept = []
+        moved = []
+        for task in tasks:
+            if task.done and not task.interval and \
+                    (undated if task.date is None else task.date < cutoff):
+                moved.append(task)
+            else:
+                kept.append(task)
+        if not moved:
+            return 0
+        tasks[:] = kept
+        for task in moved:
+            del self._index[task.id]
+            self._changing(task.id, task.text)
+        self._positions = None
+        self._by_date = None
+        self._archived.extend(moved)
+        return len(moved)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import datetime
+import calendar
+
+import cons
+
+
+# the least number of overdue tasks for which NumPy is used
+NUMPY_MIN_TASKS = 1000
+# months after which lengths of months moved through repeat, a February of
+# a common year comes within them
+_CLAMP_MONTHS = 48
+# days of months of a common year
+_MONTH_DAYS = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+_numpy = None
+
+
+def _get_numpy():
+    """Import NumPy on first use, return None if it is not installed."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy
+
+
+def _month_step(interval):
+    """Return the number of months in the interval or None."""
+    if interval == cons.MONTH:
+        return 1
+    elif interval == cons.YEAR:
+        return 12
+    return None
+
+
+def add_months(date, months):
+    """Move the date by a number of months.
+
+    The day is clamped to the last day of the resulting month, so 31.01
+    plus one month gives 28.02 (or 29.02) and 29.02 plus a year gives 28.02.
+    """
+    month = date.month - 1 + months
+    year = date.year + month // 12
+    month = month % 12 + 1
+    day = min(date.day, calendar.monthrange(year, month)[1])
+    return datetime.date(year, month, day)
+
+
+def _add_steps(date, months, step):
+    """Move the date by a number of months in steps of step months, as if
+    it was moved step by step.
+
+    Every step clamps the day and the next one starts from the clamped
+    day, so 31.01 moved monthly stays on the 28th after February. Only the
+    first _CLAMP_MONTHS months are walked, later ones repeat their lengths.
+    """
+    day = date.day
+    if day > 28:
+        start = date.year * 12 + date.month - 1
+        for index in range(start + step, start + min(months, _CLAMP_MONTHS),
+                           step):
+            year, month = divmod(index, 12)
+            if month == 1:
+                length = 29 if calendar.isleap(year) else 28
+            else:
+                length = _MONTH_DAYS[month]
+            if length < day:
+                day = length
+                if day == 28:
+                    break
+    return add_months(date.replace(day=day), months)
+
+
+def next_occurrence(date, interval, today=None):
+    """Return the first date on or after today reached from the date by
+    whole intervals.
+
+    arguments:
+    date -- datetime.date object
+    interval -- number of days, cons.MONTH or cons.YEAR
+    today -- datetime.date object, by default the current date
+
+    The date is returned unchanged if it is not in the past or the
+    interval is not set.
+    """
+    if today is None:
+        today = datetime.date.today()
+    if not interval or date >= today:
+        return date
+    step = _month_step(interval)
+    if step is None:
+        if not isinstance(interval, int) or interval < 0:
+            return date
+        # ceil division
+        steps = -((date - today).days // interval)
+        return date + datetime.timedelta(days=steps * interval)
+    months = (today.year - date.year) * 12 + today.month - date.month
+    months = -(-months // step) * step
+    result = _add_steps(date, months, step)
+    if result < today:
+        result = _add_steps(date, months + step, step)
+    return result
+
+
+def advance_tasks(tasks, today=None):
+    """Move dates of overdue tasks with an interval to their next occurrence.
+
+    Tasks are changed in place, return indexes of the changed tasks. With
+    NumPy installed big lists are advanced in one vectorized pass.
+    """
+    if today is None:
+        today = datetime.date.today()
+    overdue = [i for i, task in enumerate(tasks)
+               if task.date and task.interval and task.date < today]
+    if len(overdue) >= NUMPY_MIN_TASKS and _get_numpy():
+        dates = _advance_numpy([tasks[i].date for i in overdue],
+                               [tasks[i].interval for i in overdue],
+                               today)
+    else:
+        dates = [next_occurrence(tasks[i].date, tasks[i].interval, today)
+                 for i in overdue]
+    changed = []
+    for i, date in zip(overdue, dates):
+        if date != tasks[i].date:
+            tasks[i].date = date
+            changed.append(i)
+    return changed
+
+
+def _advance_numpy(dates, intervals, today):
+    """Vectorized next_occurrence for overdue dates."""
+    np = _get_numpy()
+    epoch = datetime.date(1970, 1, 1).toordinal()
+    days = np.array([date.toordinal() - epoch for date in dates],
+                    dtype='int64')
+    now = today.toordinal() - epoch
+    result = days.copy()
+
+    # intervals in days
+    day_steps = np.array([i if _month_step(i) is None and
+                          isinstance(i, int) and i > 0 else 0
+                          for i in intervals], dtype='int64')
+    mask = day_steps > 0
+    if mask.any():
+        d, step = days[mask], day_steps[mask]
+        result[mask] = d - ((d - now) // step) * step
+
+    # months and years
+    month_steps = np.array([_month_step(i) or 0 for i in intervals],
+                           dtype='int64')
+    mask = month_steps > 0
+    if mask.any():
+        d = days[mask].astype('datetime64[D]')
+        step = month_steps[mask]
+        month = d.astype('datetime64[M]')
+        day = (d - month.astype('datetime64[D]')).astype('int64')
+        today64 = np.datetime64(today, 'D')
+        diff = (today64.astype('datetime64[M]') - month).astype('int64')
+        shift = -(-diff // step) * step
+
+        def last_day(target):
+            return ((target + 1).astype('datetime64[D]') -
+                    target.astype('datetime64[D]')).astype('int64') - 1
+
+        # only days after the 28th are clamped
+        late = day > 27
+
+        def clamped(shift):
+            # days clamped by months passed on the way, see _add_steps
+            clamped_day = day.copy()
+            if late.any():
+                late_day = day[late]
+                late_month, late_step = month[late], step[late]
+                walked = np.minimum(shift[late], _CLAMP_MONTHS)
+                for n in range(1, _CLAMP_MONTHS):
+                    passed = n * late_step < walked
+                    if not passed.any():
+                        break
+                    late_day = np.where(
+                        passed, np.minimum(late_day, last_day(
+                            late_month + n * late_step)), late_day)
+                clamped_day[late] = late_day
+            target = month + shift
+            return target.astype('datetime64[D]') + np.minimum(
+                clamped_day, last_day(target))
+
+        candidate = clamped(shift)
+        candidate = np.where(candidate < today64, clamped(shift + step),
+                             candidate)
+        result[mask] = candidate.astype('int64')
+
+    return [datetime.date.fromordinal(int(n) + epoch) for n in result]
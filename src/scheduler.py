@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import sys
+import time
+import shlex
+import heapq
+import datetime
+import itertools
+import subprocess
+
+import cons
+import recurrence
+import tasklist
+
+
+def state_path_for(tasks_path):
+    """Return the path of the file with the time of the last reminder of a
+    todo file (see ReminderScheduler).
+    """
+    return '{}.reminded'.format(tasks_path)
+
+
+def print_reminder(task):
+    """Print a reminder of the task, a line with its text and date."""
+    print(tasklist.format_task(task, status=False), flush=True)
+
+
+class CommandSink:
+    """Run a command for every reminder.
+
+    The line of print_reminder is passed as the last argument and the ID
+    of the task in PYTASKS_TASK_ID, e.g. 'notify-send PyTasks' shows
+    desktop notifications.
+    """
+
+    def __init__(self, command):
+        """arguments:
+        command -- command line split as by a shell
+        """
+        self.args = shlex.split(command)
+
+    def __call__(self, task):
+        env = dict(os.environ, PYTASKS_TASK_ID=str(task.id))
+        try:
+            subprocess.run(self.args + [tasklist.format_task(task, False)],
+                           env=env)
+        except OSError as err:
+            print('Reminder command failed: {}'.format(err), file=sys.stderr)
+
+
+class ReminderScheduler:
+    """Reminders of incomplete tasks given when their dates come.
+
+    Reminders are given at cons.REMIND_HOUR of the task's date, ones of
+    overdue tasks at once. A min-heap holds the next reminder of every
+    dated incomplete task, so the next deadline is always at its top.
+    After a reminder of a recurring task the task is put back with its
+    next occurrence in O(log n) time, the todo file is not written.
+
+    Tasks are read again only when the storage files change, see
+    changed(). A task is reminded once for every date, also when tasks
+    are read again. With a state file also after a restart: the first
+    fire() skips reminders up to the time of the last one given.
+    """
+
+    def __init__(self, parser, sinks, remind_hour=cons.REMIND_HOUR,
+                 state_path=None):
+        """arguments:
+        parser -- TaskParser object
+        sinks -- functions called with a copy of every reminded task, its
+            date is the one of the reminder
+        remind_hour -- hour of the day when reminders are given
+        state_path -- file keeping the time of the last reminder, see
+            state_path_for
+        """
+        self.parser = parser
+        self.sinks = list(sinks)
+        self.remind_hour = remind_hour
+        self.state_path = state_path
+        self._since = self._read_state()
+        # time of the reminder, sequence number and task
+        self._heap = []
+        self._sequence = itertools.count()
+        # task ID -> date of the last reminder
+        self._reminded = {}
+        self._signature = None
+        self.rebuild()
+
+    def _read_state(self):
+        if self.state_path is None:
+            return None
+        try:
+            with open(self.state_path) as f:
+                return datetime.datetime.fromisoformat(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def _write_state(self, now):
+        try:
+            with open(self.state_path, 'w') as f:
+                f.write(now.isoformat())
+        except OSError as err:
+            print('Time of reminders cannot be saved: {}'.format(err),
+                  file=sys.stderr)
+
+    def _time(self, date):
+        return datetime.datetime.combine(date,
+                                         datetime.time(self.remind_hour))
+
+    def _next_date(self, task, date):
+        """Return the first date from the given one for which the task has
+        not been reminded yet or None if there is no such date.
+        """
+        reminded = self._reminded.get(task.id)
+        if reminded is None or date > reminded:
+            return date
+        if not task.interval:
+            return None
+        date = recurrence.next_occurrence(
+            date, task.interval, reminded + datetime.timedelta(days=1))
+        # intervals which do not move the date
+        return date if date > reminded else None
+
+    def rebuild(self):
+        """Make the heap from the tasks of the parser."""
+        self._signature = self.parser.storage.signature()
+        heap = []
+        for task in self.parser.select_tasks(comp=False, sort=True):
+            date = self._next_date(task, task.date)
+            if date is not None:
+                heap.append((self._time(date), next(self._sequence), task))
+        # tasks are sorted by dates, so the list is almost a heap already
+        heapq.heapify(heap)
+        self._heap = heap
+
+    def changed(self):
+        """Make the heap again if the storage files have changed since it
+        was made. Return True in that case.
+        """
+        if self.parser.storage.signature() == self._signature:
+            return False
+        self.rebuild()
+        return True
+
+    def seconds_left(self, now=None):
+        """Return seconds to the next reminder, None if there is none."""
+        if not self._heap:
+            return None
+        now = now or datetime.datetime.now()
+        return max(0, (self._heap[0][0] - now).total_seconds())
+
+    def fire(self, now=None):
+        """Give reminders whose time has come, return the list of reminded
+        tasks, so they can also be shown at once.
+        """
+        now = now or datetime.datetime.now()
+        since, self._since = self._since, None
+        given = []
+        while self._heap and self._heap[0][0] <= now:
+            when, sequence, task = self._heap[0]
+            reminded = task.copy()
+            reminded.date = when.date()
+            self._reminded[task.id] = reminded.date
+            date = self._next_date(task, reminded.date)
+            if date is None:
+                heapq.heappop(self._heap)
+            else:
+                heapq.heapreplace(self._heap, (self._time(date),
+                                               next(self._sequence), task))
+            if since is not None and when <= since:
+                continue
+            for sink in self.sinks:
+                sink(reminded)
+            given.append(reminded)
+        if given and self.state_path is not None:
+            self._write_state(now)
+        return given
+
+
+def serve(scheduler):
+    """Give reminders until the program is interrupted.
+
+    With GLib the storage files are watched by watch.FileWatcher and the
+    program sleeps until the next reminder or change, tasks are read again
+    only after a change. Without it the files are never checked, changes
+    are taken by the next start. The program sleeps until the next
+    reminder, at most cons.REMIND_MAX_WAIT seconds, as sleeping stops
+    while the computer does.
+    """
+    try:
+        from gi.repository import GLib
+        import watch
+    except ImportError:
+        print('Changes of tasks are not watched without GLib (PyGObject)',
+              file=sys.stderr)
+        while True:
+            scheduler.fire()
+            seconds = scheduler.seconds_left()
+            if seconds is None or seconds > cons.REMIND_MAX_WAIT:
+                seconds = cons.REMIND_MAX_WAIT
+            time.sleep(seconds)
+    timer = watch.ReminderTimer(scheduler)
+    watcher = watch.FileWatcher(scheduler.parser.storage.files(),
+                                timer.on_files_changed)
+    try:
+        GLib.MainLoop().run()
+    finally:
+        watcher.stop()
+        timer.stop()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import re
+import json
+
+from stats import STATS
+
+
+_find_words = re.compile(r'\w+').findall
+
+# the greatest character, so every word beginning with a prefix is lower
+# than the prefix followed by it
+_LAST_CHAR = '\U0010ffff'
+
+
+def split_words(text):
+    """Return lowercase words of the text."""
+    if not text:
+        return []
+    return _find_words(text.casefold())
+
+
+def matches(words, text):
+    """Tell if every word (see split_words) begins a word of the text."""
+    text_words = split_words(text)
+    return all(any(text_word.startswith(word) for text_word in text_words)
+               for word in words)
+
+
+class SearchIndex:
+    """Inverted index of words of task texts kept in an SQLite database.
+
+    The database has the todo file's name with '.index' extension. Every
+    word of a task text is a row with the task ID, rows are ordered by
+    words, so tasks with words beginning with a prefix are found by a range
+    scan without reading the tasks. Words found in many rows are looked up
+    only for tasks found by the rarer ones, by the index on IDs.
+
+    The index is made for the storage files with a stamp (see
+    Storage.stamp()). Changes are passed by update() with the stamps from
+    before and after a write, an index which has missed a write is rebuilt
+    by the parser.
+    """
+
+    # rows counted for a word to choose the rarest one and the most tasks
+    # checked by the index on IDs
+    FEW = 500
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS words (
+            word TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            PRIMARY KEY (word, id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS words_id ON words (id, word);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, path):
+        # imported here, so programs which do not search do not pay for it
+        import sqlite3
+        self.path = path
+        self._error = sqlite3.Error
+        # the connection may be used by the write-behind thread, never by
+        # two threads at once
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.executescript(self.SCHEMA)
+
+    @staticmethod
+    def path_for(tasks_path):
+        """Return the path of the index of a todo file."""
+        return '{}.index'.format(os.path.splitext(tasks_path)[0])
+
+    def stamp(self):
+        """Return the stamp of the storage files or None if the index does
+        not belong to any.
+        """
+        row = self._db.execute(
+            'SELECT value FROM meta WHERE key = \'stamp\'').fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_stamp(self, stamp):
+        self._db.execute('INSERT OR REPLACE INTO meta VALUES (\'stamp\', ?)',
+                         (json.dumps(stamp),))
+
+    def rebuild(self, texts, stamp):
+        """Replace the index.
+
+        arguments:
+        texts -- iterable of task IDs and texts
+        stamp -- stamp of the storage files with these texts
+        """
+        rows = []
+        for task_id, text in texts:
+            rows.extend((word, task_id) for word in set(split_words(text)))
+        # sorted rows and the index made after them are written faster
+        rows.sort()
+        with self._db:
+            self._db.execute('BEGIN IMMEDIATE')
+            self._db.execute('DROP INDEX IF EXISTS words_id')
+            self._db.execute('DELETE FROM words')
+            self._db.executemany('INSERT INTO words VALUES (?, ?)', rows)
+            self._db.execute('CREATE INDEX words_id ON words (id, word)')
+            self._set_stamp(stamp)
+        STATS.count('words_indexed', len(rows))
+
+    def update(self, changes, old_stamp, stamp):
+        """Apply changes written to the storage.
+
+        arguments:
+        changes -- iterable of task IDs, old and new texts (None for added
+            and deleted tasks)
+        old_stamp -- stamp of the storage files before the write
+        stamp -- stamp after the write
+
+        The index is left as it is if it has not been made for the files
+        from before the write. Return True if the changes have been applied.
+        """
+        try:
+            with self._db:
+                # no other program can write between the check and update
+                self._db.execute('BEGIN IMMEDIATE')
+                if self.stamp() != old_stamp:
+                    return False
+                for task_id, old_text, text in changes:
+                    old_words = set(split_words(old_text))
+                    words = set(split_words(text))
+                    self._db.executemany(
+                        'DELETE FROM words WHERE word = ? AND id = ?',
+                        ((word, task_id) for word in old_words - words))
+                    self._db.executemany(
+                        'INSERT OR IGNORE INTO words VALUES (?, ?)',
+                        ((word, task_id) for word in words - old_words))
+                self._set_stamp(stamp)
+        except self._error:
+            # e.g. locked by another program for too long, the changes are
+            # rolled back and the old stamp makes the index rebuilt
+            return False
+        return True
+
+    def invalidate(self):
+        """Make the index rebuilt before it is used, e.g. after all tasks
+        have been replaced.
+        """
+        try:
+            with self._db:
+                self._set_stamp(None)
+        except self._error:
+            # the stamp is left from before the write, it does not match
+            # the files either
+            pass
+
+    def search(self, words):
+        """Return a set of IDs of tasks with texts containing words which
+        begin with every given word (see split_words).
+        """
+        counted = []
+        for word in set(words):
+            count, = self._db.execute(
+                'SELECT COUNT(*) FROM (SELECT 1 FROM words '
+                'WHERE word >= ? AND word < ? LIMIT ?)',
+                (word, word + _LAST_CHAR, self.FEW)).fetchone()
+            counted.append((count, word))
+        counted.sort()
+        ids = None
+        for count, word in counted:
+            bounds = [word, word + _LAST_CHAR]
+            if ids is None or count < self.FEW or len(ids) >= self.FEW:
+                found = self._db.execute(
+                    'SELECT id FROM words WHERE word >= ? AND word < ?',
+                    bounds)
+            else:
+                found = self._db.execute(
+                    'SELECT id FROM words WHERE id IN ({}) '
+                    'AND word >= ? AND word < ?'.format(
+                        ', '.join('?' * len(ids))),
+                    list(ids) + bounds)
+            found = {row[0] for row in found}
+            ids = found if ids is None else ids & found
+            if not ids:
+                break
+        return ids
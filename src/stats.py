@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import time
+import contextlib
+import collections
+
+
+class Stats:
+    """Counters and timings of parser and storage operations.
+
+    Counters are numbers like file opens or bytes read, timings keep the
+    total time in seconds and the number of calls of an operation.
+
+        with STATS.timer('json_decode'):
+            tasks = json.loads(data)
+        STATS.count('bytes_read', len(data))
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        self.counters = collections.Counter()
+        self.timings = collections.defaultdict(lambda: [0.0, 0])
+
+    def count(self, name, n=1):
+        """Add n to the counter."""
+        self.counters[name] += n
+
+    def add_time(self, name, seconds):
+        """Record one call of an operation which took the seconds."""
+        timing = self.timings[name]
+        timing[0] += seconds
+        timing[1] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """Record the time spent in the block as one call of an operation."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def as_dict(self):
+        """Return the counters and timings as a dictionary, timings are
+        (seconds, calls) tuples.
+        """
+        result = dict(self.counters)
+        result.update((name, tuple(timing))
+                      for name, timing in self.timings.items())
+        return result
+
+    def report(self):
+        """Return a formatted table of the counters and timings."""
+        lines = ['{:<20} {:>12}'.format(name, n)
+                 for name, n in sorted(self.counters.items())]
+        lines.extend('{:<20} {:>10.6f} s {:>6} calls'.format(name, *timing)
+                     for name, timing in sorted(self.timings.items()))
+        return '\n'.join(lines)
+
+
+# statistics of all parsers and storages in the process
+STATS = Stats()
@@ -0,0 +1,957 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import re
+import sys
+import json
+import json.scanner
+import datetime
+import threading
+import zlib
+import heapq
+import struct
+import array
+import mmap
+
+import cons
+import codec
+from task import Task
+from stats import STATS
+
+
+_scan = json.scanner.make_scanner(json.JSONDecoder())
+# whitespace and commas between values of a list
+_skip_separators = re.compile(r'[\s,]*').match
+
+
+def iter_json_list(f, chunk_size=cons.READ_CHUNK_SIZE):
+    """Yield values of a JSON list read from a text file in chunks, so the
+    whole file is never held in memory.
+
+    An empty file is an empty list. Raise ValueError if the data is not a
+    list or ends in the middle of it.
+    """
+    data = f.read(chunk_size)
+    STATS.count('bytes_read', len(data))
+    while data.isspace():
+        data = f.read(chunk_size)
+        STATS.count('bytes_read', len(data))
+    if not data:
+        return
+    pos = len(data) - len(data.lstrip())
+    if data[pos] != '[':
+        raise ValueError('Not a JSON list')
+    pos += 1
+    eof = False
+    while True:
+        # todo files have ',' between values, older ones ', '
+        if data.startswith(',[', pos):
+            pos += 1
+        elif data.startswith(', ', pos):
+            pos += 2
+        else:
+            pos = _skip_separators(data, pos).end()
+        try:
+            value, end = _scan(data, pos)
+        except (StopIteration, ValueError):
+            # the value may be cut by the end of the chunk
+            end = None
+        # a number cut by the end of the chunk is still a number, so the
+        # value must be followed by a separator
+        if end is not None and (eof or end < len(data) and
+                                data[end] in ', \t\n\r]'):
+            yield value
+            pos = end
+            continue
+        if data.startswith(']', pos):
+            return
+        if eof:
+            raise ValueError('Unterminated JSON list')
+        chunk = f.read(chunk_size)
+        STATS.count('bytes_read', len(chunk))
+        eof = not chunk
+        data = data[pos:] + chunk
+        pos = 0
+
+
+def write_atomic(path, data):
+    """Replace the file with data, so it is never left half written."""
+    tmp_path = '{}.tmp'.format(path)
+    STATS.count('file_opens')
+    STATS.count('bytes_written', len(data))
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class Storage:
+    """Base class of storage backends.
+
+    A backend loads and saves the whole list of tasks, methods changing a
+    single task may be overridden to save only the changed part.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # file with the date of the last update
+        self.updated_path = '{}.updated'.format(path)
+
+    def signature(self):
+        """Return a value which changes whenever the stored tasks change."""
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def files(self):
+        """Return paths of files holding the tasks."""
+        return [self.path]
+
+    def digest(self):
+        """Return a checksum of the files holding the tasks.
+
+        Unlike signature() it does not change when a file is touched or
+        written again with the same content.
+        """
+        checksum = 0
+        for path in self.files():
+            STATS.count('file_opens')
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except IOError:
+                continue
+            STATS.count('bytes_read', len(data))
+            checksum = zlib.crc32(data, checksum)
+        return checksum
+
+    def stamp(self):
+        """Return modification times, sizes and inodes of files(), None for
+        a missing file.
+
+        Unlike signature() of some backends it can be compared between
+        programs, e.g. it is kept by search.SearchIndex.
+        """
+        stamp = []
+        for path in self.files():
+            try:
+                st = os.stat(path)
+            except OSError:
+                stamp.append(None)
+            else:
+                stamp.append([st.st_mtime_ns, st.st_size, st.st_ino])
+        return stamp
+
+    def load(self):
+        """Return a list with decoded tasks."""
+        raise NotImplementedError
+
+    def save(self, tasks):
+        """Write all tasks, the list is not modified."""
+        raise NotImplementedError
+
+    def query(self, done=None, dated=False, since=None, before=None,
+              limit=None, offset=0):
+        """Return a list of tasks matching the filter or None if the
+        storage cannot select tasks without loading all of them.
+
+        arguments:
+        done -- status of returned tasks, None for any
+        dated -- return only tasks with a date, sorted by it
+        since -- return only tasks with a date on or after it
+        before -- return only tasks with a date before it
+        limit -- return at most this number of tasks
+        offset -- skip this number of matching tasks first
+
+        Tasks with dates in a range are sorted by them, like dated ones.
+        Tasks with the same date keep their order.
+        """
+        return None
+
+    def iter_tasks(self, done=None, dates=True):
+        """Yield stored tasks one by one.
+
+        arguments:
+        done -- status of yielded tasks, None for any
+        dates -- False if dates are not needed, a storage may leave them
+            None then
+
+        Dates are the stored ones, not moved by recurrence. A storage may
+        read the tasks as they are taken and skip decoding filtered ones.
+        """
+        for task in self.load():
+            if done is None or task.done == done:
+                yield task
+
+    def count(self, done=None):
+        """Return the number of stored tasks, only ones with the status if
+        done is given.
+        """
+        return sum(1 for task in self.iter_tasks(done, False))
+
+    def get_updated(self):
+        """Return the date of the last update of recurring tasks or None.
+
+        The date is kept in the todo file with '.updated' suffix.
+        """
+        STATS.count('file_opens')
+        try:
+            with open(self.updated_path) as f:
+                return datetime.datetime.strptime(f.read().strip(),
+                                                  '%Y-%m-%d').date()
+        except (IOError, ValueError):
+            return None
+
+    def set_updated(self, date):
+        """Remember the date on which recurring tasks have been updated."""
+        STATS.count('file_opens')
+        with open(self.updated_path, 'w') as f:
+            f.write(date.isoformat())
+
+    # Methods below are called after the change has been made to the list
+    # of tasks, a storage may save only the changed part. Tasks passed to
+    # them have IDs.
+
+    def add(self, tasks, task):
+        self.save(tasks)
+
+    def edit(self, tasks, index, task):
+        self.save(tasks)
+
+    def delete(self, tasks, index, task):
+        self.save(tasks)
+
+    def swap(self, tasks, index_a, index_b):
+        self.save(tasks)
+
+
+class JSONStorage(Storage):
+    """Tasks kept as a JSON list in a single file.
+
+    Every change rewrites the whole file.
+    """
+
+    def load(self):
+        STATS.count('file_opens')
+        with open(self.path, encoding='utf-8') as f:
+            data = f.read()
+        STATS.count('bytes_read', len(data))
+        return codec.decode_tasks(data)
+
+    def _iter_records(self):
+        """Yield JSON values read from the file in chunks, a broken file
+        ends where it can no longer be read.
+        """
+        STATS.count('file_opens')
+        with open(self.path, encoding='utf-8') as f:
+            try:
+                yield from iter_json_list(f)
+            except ValueError:
+                pass
+
+    def iter_tasks(self, done=None, dates=True):
+        return codec.decode_records(self._iter_records(), done, dates)
+
+    def count(self, done=None):
+        return codec.count_records(self._iter_records(), done)
+
+    def save(self, tasks):
+        data = codec.encode_tasks(tasks)
+        STATS.count('file_opens')
+        STATS.count('bytes_written', len(data))
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(data)
+
+
+class JournalStorage(JSONStorage):
+    """Tasks kept as a JSON snapshot plus an append-only journal.
+
+    Every change appends one record to the journal (the snapshot file with
+    '.journal' suffix), loading replays the journal over the snapshot. The
+    first line of the journal holds a checksum of the snapshot it applies
+    to, so a journal left after an interrupted compaction is ignored.
+
+    The snapshot has the same format as JSONStorage, so an existing todo
+    file is read as a snapshot with an empty journal.
+    """
+
+    def __init__(self, path, compact_size=cons.JOURNAL_COMPACT_SIZE):
+        super(JournalStorage, self).__init__(path)
+        self.journal_path = '{}.journal'.format(path)
+        self.compact_size = compact_size
+        # checksum of the snapshot file
+        self._checksum = None
+        # size of the valid part of the journal
+        self._journal_size = 0
+        # incremented whenever the snapshot is replaced
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._compactor = None
+
+    def signature(self):
+        try:
+            st = os.stat(self.journal_path)
+        except OSError:
+            journal = None
+        else:
+            journal = st.st_mtime_ns, st.st_size, st.st_ino
+        return super(JournalStorage, self).signature(), journal
+
+    def files(self):
+        return [self.path, self.journal_path]
+
+    # the journal is replayed over all tasks of the snapshot
+    iter_tasks = Storage.iter_tasks
+    count = Storage.count
+
+    def load(self):
+        with self._lock:
+            STATS.count('file_opens')
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            STATS.count('bytes_read', len(data))
+            self._checksum = zlib.crc32(data)
+            self._generation += 1
+            tasks = codec.decode_tasks(data.decode('utf-8'))
+            self._journal_size = 0
+            STATS.count('file_opens')
+            try:
+                with open(self.journal_path, 'rb') as f:
+                    journal = f.read()
+            except IOError:
+                return tasks
+            STATS.count('bytes_read', len(journal))
+            self._replay(tasks, journal)
+            return tasks
+
+    def _replay(self, tasks, journal):
+        """Apply the journal records to the tasks."""
+        # records refer to tasks by IDs, deleted tasks leave None in order
+        self._by_id = {task.id: task for task in tasks}
+        self._order = [task.id for task in tasks]
+        self._positions = {task_id: i for i, task_id in enumerate(self._order)}
+        offset = 0
+        for line in journal.splitlines(True):
+            # a record without the newline was not written completely
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = codec.loads(line.decode('utf-8'))
+            except ValueError:
+                break
+            if offset == 0:
+                if record.get('snapshot') != self._checksum:
+                    # the snapshot already contains these changes
+                    return
+            else:
+                self._apply(record)
+            offset += len(line)
+        self._journal_size = offset
+        tasks[:] = [self._by_id[task_id] for task_id in self._order
+                    if task_id is not None]
+        del self._by_id, self._order, self._positions
+
+    def _apply(self, record):
+        op = record['op']
+        if op == 'add':
+            task = codec.decode_task(record['task'])
+            self._by_id[task.id] = task
+            self._positions[task.id] = len(self._order)
+            self._order.append(task.id)
+        elif op == 'edit':
+            task = codec.decode_task(record['task'])
+            self._by_id[task.id] = task
+        elif op == 'delete':
+            del self._by_id[record['id']]
+            self._order[self._positions.pop(record['id'])] = None
+        elif op == 'swap':
+            a = self._positions[record['id_a']]
+            b = self._positions[record['id_b']]
+            self._order[a], self._order[b] = self._order[b], self._order[a]
+            self._positions[record['id_a']] = b
+            self._positions[record['id_b']] = a
+
+    def _header(self, checksum):
+        return (codec.dumps({'snapshot': checksum}) + '\n').encode('utf-8')
+
+    def _append(self, tasks, record):
+        """Append a record to the journal and sync it to the disk."""
+        line = (codec.dumps(record) + '\n').encode('utf-8')
+        with self._lock:
+            if self._journal_size == 0:
+                # missing or stale journal, start a new one
+                write_atomic(self.journal_path, self._header(self._checksum))
+                self._journal_size = len(self._header(self._checksum))
+            STATS.count('file_opens')
+            STATS.count('bytes_written', len(line))
+            with open(self.journal_path, 'r+b') as f:
+                # drop a partially written record left by a crash
+                f.truncate(self._journal_size)
+                f.seek(self._journal_size)
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_size += len(line)
+            compact = self._journal_size > self.compact_size and \
+                    self._compactor is None
+        if compact:
+            self.compact(tasks, background=True)
+
+    def save(self, tasks):
+        self.wait()
+        data = codec.encode_tasks(tasks)
+        with self._lock:
+            self._write_snapshot(data.encode('utf-8'))
+
+    def _write_snapshot(self, data):
+        """Replace the snapshot, the journal becomes stale at once."""
+        write_atomic(self.path, data)
+        # a snapshot equal to the one of the journal would not make it
+        # stale, e.g. an empty list after deleting added tasks
+        try:
+            os.remove(self.journal_path)
+        except FileNotFoundError:
+            pass
+        self._checksum = zlib.crc32(data)
+        self._journal_size = 0
+        self._generation += 1
+
+    def compact(self, tasks, background=False):
+        """Fold the journal into a new snapshot.
+
+        With background set the snapshot is written by a separate thread,
+        records appended in the meantime are moved to the new journal.
+        """
+        data = codec.encode_tasks(tasks)
+        with self._lock:
+            offset = self._journal_size
+            generation = self._generation
+        if not background:
+            self._compact(data, offset, generation)
+            return
+        self._compactor = threading.Thread(target=self._compact,
+                                           args=(data, offset, generation))
+        self._compactor.start()
+
+    def _compact(self, data, offset, generation):
+        data = data.encode('utf-8')
+        with self._lock:
+            if generation != self._generation or self._journal_size == 0:
+                # the snapshot has been replaced in the meantime
+                self._compactor = None
+                return
+            with open(self.journal_path, 'rb') as f:
+                f.seek(offset)
+                tail = f.read(self._journal_size - offset)
+            self._write_snapshot(data)
+            header = self._header(self._checksum)
+            write_atomic(self.journal_path, header + tail)
+            self._journal_size = len(header) + len(tail)
+            self._compactor = None
+
+    def wait(self):
+        """Wait for a running compaction."""
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+    def add(self, tasks, task):
+        self._append(tasks, {'op': 'add', 'task': codec.encode_task(task)})
+
+    def edit(self, tasks, index, task):
+        self._append(tasks, {'op': 'edit', 'task': codec.encode_task(task)})
+
+    def delete(self, tasks, index, task):
+        self._append(tasks, {'op': 'delete', 'id': task.id})
+
+    def swap(self, tasks, index_a, index_b):
+        self._append(tasks, {
+            'op': 'swap',
+            'id_a': tasks[index_a].id,
+            'id_b': tasks[index_b].id
+        })
+
+
+class SQLiteStorage(Storage):
+    """Tasks kept in an SQLite database next to the todo file.
+
+    The database has the todo file's name with '.db' extension. Tasks are
+    rows keyed by their IDs and ordered by the position column (which may
+    have gaps), dates are stored as ordinals and there are indexes on date,
+    done and text, so filtering is done by the database and a change of
+    one task updates only its row.
+
+    When the database is created, tasks from the todo file are imported.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            position INTEGER NOT NULL,
+            text TEXT,
+            date INTEGER,
+            interval,
+            done INTEGER NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS tasks_position ON tasks (position);
+        CREATE INDEX IF NOT EXISTS tasks_date ON tasks (date);
+        CREATE INDEX IF NOT EXISTS tasks_done ON tasks (done, date);
+        CREATE INDEX IF NOT EXISTS tasks_text ON tasks (text);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, path):
+        super(SQLiteStorage, self).__init__(path)
+        # imported here, so other backends do not pay for it at startup
+        import sqlite3
+        self.db_path = '{}.db'.format(os.path.splitext(path)[0])
+        created = not os.path.exists(self.db_path)
+        # the connection may be passed to a writing thread, it is never
+        # used by two threads at once
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self._db:
+            self._db.executescript(self.SCHEMA)
+        if created:
+            migrate(JSONStorage(path), self)
+
+    def signature(self):
+        # changes when another connection commits to the database
+        return self._db.execute('PRAGMA data_version').fetchone()[0]
+
+    def files(self):
+        return [self.db_path]
+
+    COLUMNS = 'text, date, interval, done, id'
+
+    def _decode(self, row):
+        text, date, interval, done, task_id = row
+        return Task(text, datetime.date.fromordinal(date) if date else None,
+                    interval, bool(done), task_id)
+
+    def _encode(self, task):
+        return (task.text,
+                task.date.toordinal() if task.date else None,
+                task.interval,
+                bool(task.done),
+                task.id)
+
+    def load(self):
+        return [self._decode(row) for row in self._db.execute(
+            'SELECT {} FROM tasks ORDER BY position'.format(self.COLUMNS))]
+
+    def iter_tasks(self, done=None, dates=True):
+        sql = 'SELECT {} FROM tasks'.format(self.COLUMNS)
+        args = []
+        if done is not None:
+            sql += ' WHERE done = ?'
+            args.append(bool(done))
+        # rows are read from the cursor as they are taken
+        for row in self._db.execute(sql + ' ORDER BY position', args):
+            yield self._decode(row)
+
+    def count(self, done=None):
+        if done is None:
+            row = self._db.execute('SELECT COUNT(*) FROM tasks').fetchone()
+        else:
+            row = self._db.execute('SELECT COUNT(*) FROM tasks '
+                                   'WHERE done = ?', (bool(done),)).fetchone()
+        return row[0]
+
+    def save(self, tasks):
+        with self._db:
+            self._db.execute('DELETE FROM tasks')
+            self._db.executemany(
+                'INSERT INTO tasks (position, {}) '
+                'VALUES (?, ?, ?, ?, ?, ?)'.format(self.COLUMNS),
+                ((i,) + self._encode(task) for i, task in enumerate(tasks)))
+
+    def query(self, done=None, dated=False, since=None, before=None,
+              limit=None, offset=0):
+        where = []
+        args = []
+        if done is not None:
+            where.append('done = ?')
+            args.append(bool(done))
+        if since is not None:
+            where.append('date >= ?')
+            args.append(since.toordinal())
+        if before is not None:
+            where.append('date < ?')
+            args.append(before.toordinal())
+        dated = dated or since is not None or before is not None
+        if dated:
+            where.append('date IS NOT NULL')
+        sql = 'SELECT {} FROM tasks'.format(self.COLUMNS)
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY date, position' if dated else ' ORDER BY position'
+        if limit is not None or offset:
+            # -1 is no limit
+            sql += ' LIMIT ? OFFSET ?'
+            args.extend((-1 if limit is None else limit, offset))
+        return [self._decode(row) for row in self._db.execute(sql, args)]
+
+    def get_updated(self):
+        row = self._db.execute(
+            'SELECT value FROM meta WHERE key = \'updated\'').fetchone()
+        if row:
+            return datetime.date.fromordinal(int(row[0]))
+        return None
+
+    def set_updated(self, date):
+        with self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO meta VALUES (\'updated\', ?)',
+                (str(date.toordinal()),))
+
+    def add(self, tasks, task):
+        with self._db:
+            self._db.execute(
+                'INSERT INTO tasks (position, {}) '
+                'SELECT COALESCE(MAX(position), -1) + 1, ?, ?, ?, ?, ? '
+                'FROM tasks'.format(self.COLUMNS), self._encode(task))
+
+    def edit(self, tasks, index, task):
+        with self._db:
+            self._db.execute(
+                'UPDATE tasks SET text = ?, date = ?, interval = ?, done = ? '
+                'WHERE id = ?', self._encode(task))
+
+    def delete(self, tasks, index, task):
+        with self._db:
+            self._db.execute('DELETE FROM tasks WHERE id = ?', (task.id,))
+
+    def swap(self, tasks, index_a, index_b):
+        # tasks are already swapped, so they take each other's positions
+        id_a, id_b = tasks[index_a].id, tasks[index_b].id
+        with self._db:
+            position_a, position_b = (self._db.execute(
+                'SELECT position FROM tasks WHERE id = ?',
+                (task_id,)).fetchone()[0] for task_id in (id_a, id_b))
+            self._db.execute('UPDATE tasks SET position = -1 '
+                             'WHERE id = ?', (id_a,))
+            self._db.execute('UPDATE tasks SET position = ? '
+                             'WHERE id = ?', (position_a, id_b))
+            self._db.execute('UPDATE tasks SET position = ? '
+                             'WHERE id = ?', (position_b, id_a))
+
+
+class BinaryStorage(Storage):
+    """Tasks kept in a compact columnar file next to the todo file.
+
+    The file has the todo file's name with '.bin' extension. After the
+    header there are fixed-width columns for a number of tasks (the
+    capacity): a bitset of done flags, dates as int32 ordinals (0 when not
+    set), intervals as int32 (days, INTERVAL_MONTH, INTERVAL_YEAR or 0),
+    IDs as int32 (0 when not set) and (offset, length) pairs pointing into the heap of UTF-8
+    texts which ends the file. Files of version 1 have no IDs, they are
+    rewritten on the first change.
+
+    The file is read through mmap, so query() checks done flags and dates
+    without decoding texts of skipped tasks. Changing a task, swapping two
+    ones or adding a task when there is spare capacity patches the file in
+    place, a changed text is appended to the heap. Other changes rewrite
+    the file.
+
+    When the file is created, tasks from the todo file are imported.
+    """
+
+    MAGIC = b'PTSK'
+    VERSION = 2
+    # magic, version, byte order, count, capacity, heap size
+    HEADER = struct.Struct('<4sHHIII')
+    INTERVAL_MONTH = -1
+    INTERVAL_YEAR = -2
+
+    def __init__(self, path):
+        super(BinaryStorage, self).__init__(path)
+        self.bin_path = '{}.bin'.format(os.path.splitext(path)[0])
+        self.updated_path = '{}.updated'.format(self.bin_path)
+        if not os.path.exists(self.bin_path):
+            migrate(JSONStorage(path), self)
+
+    def signature(self):
+        st = os.stat(self.bin_path)
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def files(self):
+        return [self.bin_path]
+
+    def _layout(self, capacity, version=VERSION):
+        """Return offsets of done, date, interval, id (None in version 1),
+        text columns and heap.
+        """
+        done_at = self.HEADER.size
+        # keep int32 columns aligned
+        date_at = done_at + ((capacity + 7) // 8 + 3) // 4 * 4
+        interval_at = date_at + 4 * capacity
+        if version == 1:
+            id_at = None
+            text_at = interval_at + 4 * capacity
+        else:
+            id_at = interval_at + 4 * capacity
+            text_at = id_at + 4 * capacity
+        heap_at = text_at + 8 * capacity
+        return done_at, date_at, interval_at, id_at, text_at, heap_at
+
+    def _encode_interval(self, interval):
+        if interval == cons.MONTH:
+            return self.INTERVAL_MONTH
+        elif interval == cons.YEAR:
+            return self.INTERVAL_YEAR
+        return interval or 0
+
+    def _decode_interval(self, interval):
+        if interval == self.INTERVAL_MONTH:
+            return cons.MONTH
+        elif interval == self.INTERVAL_YEAR:
+            return cons.YEAR
+        return interval or None
+
+    def _array(self, typecode, data, swap):
+        column = array.array(typecode)
+        column.frombytes(data)
+        if swap:
+            column.byteswap()
+        return column
+
+    def _read(self, f):
+        """Return the header fields and a read-only map of the file."""
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        STATS.count('bytes_mapped', len(m))
+        magic, version, order, count, capacity, heap_size = \
+                self.HEADER.unpack_from(m)
+        if magic != self.MAGIC or version not in (1, self.VERSION):
+            m.close()
+            raise ValueError('\'{}\' is not a task file'.format(
+                self.bin_path))
+        # columns are written in the native byte order of the writer
+        swap = order != (sys.byteorder == 'little')
+        return m, version, count, capacity, swap
+
+    def _columns(self, m, version, count, capacity, swap):
+        done_at, date_at, interval_at, id_at, text_at, heap_at = \
+                self._layout(capacity, version)
+        return (m[done_at:done_at + (count + 7) // 8],
+                self._array('i', m[date_at:date_at + 4 * count], swap),
+                self._array('i', m[interval_at:interval_at + 4 * count],
+                            swap),
+                self._array('i', m[id_at:id_at + 4 * count], swap)
+                if id_at else None,
+                self._array('I', m[text_at:text_at + 8 * count], swap),
+                heap_at)
+
+    def _decode(self, m, columns, i):
+        done, dates, intervals, ids, texts, heap_at = columns
+        offset, length = texts[2 * i], texts[2 * i + 1]
+        text = m[heap_at + offset:heap_at + offset + length].decode('utf-8')
+        return Task(text,
+                    datetime.date.fromordinal(dates[i]) if dates[i] else None,
+                    self._decode_interval(intervals[i]),
+                    bool(done[i >> 3] >> (i & 7) & 1),
+                    ids[i] if ids and ids[i] else None)
+
+    def load(self):
+        STATS.count('file_opens')
+        with open(self.bin_path, 'rb') as f:
+            m, version, count, capacity, swap = self._read(f)
+            try:
+                columns = self._columns(m, version, count, capacity, swap)
+                return [self._decode(m, columns, i) for i in range(count)]
+            finally:
+                m.close()
+
+    def iter_tasks(self, done=None, dates=True):
+        STATS.count('file_opens')
+        with open(self.bin_path, 'rb') as f:
+            m, version, count, capacity, swap = self._read(f)
+            try:
+                columns = self._columns(m, version, count, capacity, swap)
+                bits = columns[0]
+                for i in range(count):
+                    if done is None or \
+                            bool(bits[i >> 3] >> (i & 7) & 1) == done:
+                        yield self._decode(m, columns, i)
+            finally:
+                m.close()
+
+    def count(self, done=None):
+        STATS.count('file_opens')
+        with open(self.bin_path, 'rb') as f:
+            m, version, count, capacity, swap = self._read(f)
+            try:
+                if done is None:
+                    return count
+                done_at = self._layout(capacity, version)[0]
+                bits = m[done_at:done_at + (count + 7) // 8]
+            finally:
+                m.close()
+        completed = sum(bits[i >> 3] >> (i & 7) & 1 for i in range(count))
+        return completed if done else count - completed
+
+    def query(self, done=None, dated=False, since=None, before=None,
+              limit=None, offset=0):
+        # dates are ordinals, 0 for tasks without them
+        low = 1 if since is None else since.toordinal()
+        high = None if before is None else before.toordinal()
+        dated = dated or since is not None or before is not None
+        STATS.count('file_opens')
+        with open(self.bin_path, 'rb') as f:
+            m, version, count, capacity, swap = self._read(f)
+            try:
+                columns = self._columns(m, version, count, capacity, swap)
+                bits, dates = columns[0], columns[1]
+                indexes = [i for i in range(count)
+                           if not dated or low <= dates[i] and
+                           (high is None or dates[i] < high)
+                           if done is None or
+                           bool(bits[i >> 3] >> (i & 7) & 1) == done]
+                stop = None if limit is None else offset + limit
+                if dated and stop is not None:
+                    # the first tasks are found without sorting all of them
+                    indexes = heapq.nsmallest(stop, indexes,
+                                              key=dates.__getitem__)
+                elif dated:
+                    indexes.sort(key=dates.__getitem__)
+                indexes = indexes[offset:stop]
+                return [self._decode(m, columns, i) for i in indexes]
+            finally:
+                m.close()
+
+    def save(self, tasks):
+        count = len(tasks)
+        # leave room for tasks added later
+        capacity = count + count // 2 + 16
+        done_at, date_at, interval_at, id_at, text_at, heap_at = \
+                self._layout(capacity)
+        done = bytearray(date_at - done_at)
+        dates = array.array('i', bytes(4 * capacity))
+        intervals = array.array('i', bytes(4 * capacity))
+        ids = array.array('i', bytes(4 * capacity))
+        texts = array.array('I', bytes(8 * capacity))
+        heap = bytearray()
+        for i, task in enumerate(tasks):
+            if task.done:
+                done[i >> 3] |= 1 << (i & 7)
+            if task.date:
+                dates[i] = task.date.toordinal()
+            intervals[i] = self._encode_interval(task.interval)
+            ids[i] = task.id or 0
+            text = (task.text or '').encode('utf-8')
+            texts[2 * i], texts[2 * i + 1] = len(heap), len(text)
+            heap += text
+        header = self.HEADER.pack(self.MAGIC, self.VERSION,
+                                  sys.byteorder == 'little', count, capacity,
+                                  len(heap))
+        write_atomic(self.bin_path, b''.join((
+            header, bytes(done), dates.tobytes(), intervals.tobytes(),
+            ids.tobytes(), texts.tobytes(), bytes(heap))))
+
+    def _patch(self, fd, index, task, capacity, heap_size):
+        """Write a task to the row of the index, return new heap size."""
+        done_at, date_at, interval_at, id_at, text_at, heap_at = \
+                self._layout(capacity)
+        text = (task.text or '').encode('utf-8')
+        offset, length = struct.unpack('II',
+                                       os.pread(fd, 8, text_at + 8 * index))
+        if os.pread(fd, length, heap_at + offset) != text:
+            # append the new text to the heap
+            os.pwrite(fd, text, heap_at + heap_size)
+            os.pwrite(fd, struct.pack('II', heap_size, len(text)),
+                      text_at + 8 * index)
+            heap_size += len(text)
+        date = task.date.toordinal() if task.date else 0
+        os.pwrite(fd, struct.pack('i', date), date_at + 4 * index)
+        os.pwrite(fd, struct.pack('i',
+                                  self._encode_interval(task.interval)),
+                  interval_at + 4 * index)
+        os.pwrite(fd, struct.pack('i', task.id or 0), id_at + 4 * index)
+        byte = os.pread(fd, 1, done_at + (index >> 3))[0]
+        if task.done:
+            byte |= 1 << (index & 7)
+        else:
+            byte &= ~(1 << (index & 7))
+        os.pwrite(fd, bytes((byte,)), done_at + (index >> 3))
+        return heap_size
+
+    def _update(self, tasks, indexes, count):
+        """Patch rows of the indexes in place, with count as the new number
+        of tasks. Rewrite the whole file if it cannot be patched.
+        """
+        STATS.count('file_opens')
+        with open(self.bin_path, 'r+b') as f:
+            fd = f.fileno()
+            magic, version, order, old_count, capacity, heap_size = \
+                    self.HEADER.unpack(os.pread(fd, self.HEADER.size, 0))
+            if version != self.VERSION or \
+                    order != (sys.byteorder == 'little') or count > capacity:
+                patch = False
+            else:
+                patch = True
+                for index in indexes:
+                    heap_size = self._patch(fd, index, tasks[index],
+                                            capacity, heap_size)
+                os.pwrite(fd, self.HEADER.pack(magic, version, order, count,
+                                               capacity, heap_size), 0)
+        if not patch:
+            self.save(tasks)
+
+    def add(self, tasks, task):
+        self._update(tasks, [len(tasks) - 1], len(tasks))
+
+    def edit(self, tasks, index, task):
+        self._update(tasks, [index], len(tasks))
+
+    def swap(self, tasks, index_a, index_b):
+        STATS.count('file_opens')
+        with open(self.bin_path, 'r+b') as f:
+            fd = f.fileno()
+            version, order, count, capacity = self.HEADER.unpack(
+                    os.pread(fd, self.HEADER.size, 0))[1:5]
+            text_at = self._layout(capacity, version)[4]
+            # swap text pointers, so texts are not copied to the heap
+            text_a = os.pread(fd, 8, text_at + 8 * index_a)
+            text_b = os.pread(fd, 8, text_at + 8 * index_b)
+            os.pwrite(fd, text_b, text_at + 8 * index_a)
+            os.pwrite(fd, text_a, text_at + 8 * index_b)
+        self._update(tasks, [index_a, index_b], len(tasks))
+
+
+BACKENDS = {
+    'json': JSONStorage,
+    'journal': JournalStorage,
+    'sqlite': SQLiteStorage,
+    'binary': BinaryStorage,
+}
+
+
+def open_storage(path, backend=None):
+    """Return a storage object for the path.
+
+    backend -- name of the storage backend, cons.STORAGE by default
+    """
+    backend = backend or cons.STORAGE
+    if backend not in BACKENDS:
+        raise ValueError('Unknown storage backend \'{}\''.format(backend))
+    return BACKENDS[backend](path)
+
+
+def migrate(source, target):
+    """Copy all tasks from the source storage to the target one."""
+    target.save(source.load())
+    updated = source.get_updated()
+    if updated:
+        target.set_updated(updated)
+    return target
+
+
+if __name__ == '__main__':
+    # migrate the todo file (sys.argv[1] -- todo file, sys.argv[2] --
+    # source backend, sys.argv[3] -- target backend)
+    migrate(open_storage(sys.argv[1], sys.argv[2]),
+            open_storage(sys.argv[1], sys.argv[3]))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+class Task:
+    """A single task of the todo list.
+
+    attributes:
+    text -- description of the task
+    date -- datetime.date object or None
+    interval -- number of days, 'month' (cons.MONTH), 'year' (cons.YEAR)
+        or None
+    done -- status of the task
+    id -- unique number of the task given by the parser, None until the
+        task is added
+
+    Attributes can also be read and set like dictionary keys, as tasks
+    used to be dictionaries, so dict(task) works too. Keys include 'id',
+    so f(**task) needs a function taking it, e.g. TaskParser.edit_task.
+    """
+
+    __slots__ = ('text', 'date', 'interval', 'done', 'id')
+
+    def __init__(self, text=None, date=None, interval=None, done=False,
+                 id=None):
+        self.text = text
+        self.date = date
+        self.interval = interval
+        self.done = done
+        self.id = id
+
+    @classmethod
+    def from_dict(cls, task):
+        """Create a task from a dictionary or copy another task."""
+        return cls(task['text'], task['date'], task['interval'], task['done'],
+                   task.get('id'))
+
+    def copy(self):
+        return Task(self.text, self.date, self.interval, self.done, self.id)
+
+    def keys(self):
+        return self.__slots__
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        if isinstance(other, (Task, dict)):
+            return dict(self) == dict(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return 'Task({!r}, {!r}, {!r}, {!r}, id={!r})'.format(
+            self.text, self.date, self.interval, self.done, self.id)
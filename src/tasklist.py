@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import itertools
+
+import parser
+import cons
+from stats import STATS
+
+
+class InvalidIndexError(Exception):
+    pass
+
+
+class TaskListCLI(parser.TaskParser):
+
+    def is_valid_index(self, index):
+        return 0 < index <= self.count_tasks()
+
+    def add(self, text):
+        self.add_task(text)
+
+    def resolve(self, ref):
+        """Return the number (counted from 1) of a task given by its number
+        or by its ID prefixed with '@', e.g. '3' or '@17'.
+        """
+        ref = str(ref)
+        try:
+            if ref.startswith('@'):
+                return self.index_of(int(ref[1:])) + 1
+            index = int(ref)
+        except (ValueError, KeyError):
+            index = 0
+        if not self.is_valid_index(index):
+            raise InvalidIndexError('\'{}\' is not a valid index'.format(
+                ref))
+        return index
+
+    def delete(self, ref):
+        self.delete_task(self.resolve(ref) - 1)
+
+    def mark(self, ref):
+        """Change the status of the task."""
+        index = self.resolve(ref)
+        self.edit_task(index - 1, done=not self.get_task(index - 1).done)
+
+    def __str__(self):
+        return self.list_tasks()
+
+    def list_tasks(self, comp=True, incomp=True, status=True, number=True,
+                   sort=False, ids=False, query=None, since=None,
+                   before=None, limit=None, offset=0, archived=False):
+        """Return a formatted string with proper tasks.
+
+        arguments:
+        comp -- show completed tasks
+        incomp -- show incompleted tasks
+        status -- show status of tasks
+        number -- show numbered tasks
+        sort -- show sorted tasks by date
+        ids -- show IDs of tasks
+        query -- show only tasks found by the query (see TaskParser.search)
+        since -- show only tasks with a date on or after it, sorted by date
+        before -- show only tasks with a date before it, sorted by date
+        limit -- show at most this number of tasks
+        offset -- skip this number of tasks, numbers count them
+        archived -- show completed tasks of the archive first
+
+        By default the method returns formatted string with numbered all tasks
+        and their status.
+        """
+        lines = self.iter_lines(comp, incomp, status, number, sort, ids,
+                                query, since, before, limit, offset,
+                                archived)
+        with STATS.timer('format'):
+            return '\n'.join(lines)
+
+    def iter_lines(self, comp=True, incomp=True, status=True, number=True,
+                   sort=False, ids=False, query=None, since=None,
+                   before=None, limit=None, offset=0, archived=False):
+        """Return an iterator of lines of list_tasks, formatted when they
+        are taken, so they can be printed one by one.
+
+        Arguments are the same as of list_tasks. Tasks which need not be
+        sorted or searched are read one by one as lines are taken, the
+        archive only when its tasks are shown.
+        """
+        if sort or query or since is not None or before is not None or \
+                not (comp or incomp):
+            tasks = self.select_tasks(comp, incomp, sort, query, since,
+                                      before, limit, offset, archived)
+        else:
+            stop = None if limit is None else offset + limit
+            tasks = self.iter_tasks(None if comp and incomp else comp)
+            if archived and comp:
+                tasks = itertools.chain(self.iter_archived(), tasks)
+            tasks = itertools.islice(tasks, offset, stop)
+        return format_lines(tasks, status, number, ids, offset + 1)
+
+
+def format_task(task, status=True):
+    """Return a line showing the task's text, date and status."""
+    text = task.text
+    if task.date:
+        text = '{} ({})'.format(text, task.date.strftime(cons.DATE_FORMAT))
+    if status:
+        return '[{}] {}'.format('*' if task.done else ' ', text)
+    return text
+
+
+def format_lines(tasks, status=True, number=True, ids=False, start=1):
+    """Yield lines showing the tasks.
+
+    arguments:
+    tasks -- iterable of tasks
+    status -- show status of tasks
+    number -- number tasks, the first one with start
+    ids -- show IDs of tasks
+    """
+    for n, task in enumerate(tasks, start):
+        line = format_task(task, status)
+        if ids:
+            line = '@{} {}'.format(task.id, line)
+        if number:
+            line = '{}. {}'.format(n, line)
+        yield line
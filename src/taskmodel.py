@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import operator
+import collections
+
+from gi.repository import GObject, Gtk
+
+import cons
+
+
+def format_date(date):
+    if date:
+        return date.strftime(cons.DATE_FORMAT)
+    return ''
+
+
+def format_interval(interval):
+    # FIXME: needs translating
+    if interval == cons.MONTH:
+        return 'miesiąc'
+    elif interval == cons.YEAR:
+        return 'rok'
+    elif isinstance(interval, int):
+        return '{} dni'.format(interval)
+    return ''
+
+
+# values of a task shown in rows
+_content = operator.attrgetter('text', 'date', 'interval', 'done')
+
+
+class TaskModel(GObject.Object, Gtk.TreeModel):
+    """Tree model showing tasks of a parser without copying them.
+
+    Rows are read from the parser's tasks when the treeview asks for them,
+    dates and intervals are formatted only for shown rows and kept in an
+    LRU cache of cons.MODEL_CACHE_SIZE tasks. Tasks are changed through the
+    model, so the treeview is notified, refresh() shows changes made
+    elsewhere. A model with a query shows only tasks found by it, its rows
+    are refreshed after every change.
+
+    Columns are the same as in cons (COLUMN_ID, COLUMN_DONE, ...), iters
+    hold row numbers and are valid until the rows change.
+    """
+
+    COLUMN_TYPES = {
+        cons.COLUMN_ID: GObject.TYPE_INT,
+        cons.COLUMN_DONE: GObject.TYPE_BOOLEAN,
+        cons.COLUMN_DATE: GObject.TYPE_STRING,
+        cons.COLUMN_INTERVAL: GObject.TYPE_STRING,
+        cons.COLUMN_TEXT: GObject.TYPE_STRING,
+    }
+
+    def __init__(self, parser, query=None):
+        """arguments:
+        parser -- TaskParser object
+        query -- show only tasks found by it (see TaskParser.search)
+        """
+        super(TaskModel, self).__init__()
+        self.parser = parser
+        self._query = query
+        self._tasks = self._view()
+        # task ID -> formatted date and interval
+        self._cells = collections.OrderedDict()
+
+    def _iter(self, index):
+        it = Gtk.TreeIter()
+        it.user_data = index
+        return it
+
+    def _get_cells(self, task):
+        cells = self._cells.get(task.id)
+        if cells is None:
+            cells = format_date(task.date), format_interval(task.interval)
+            self._cells[task.id] = cells
+            if len(self._cells) > cons.MODEL_CACHE_SIZE:
+                self._cells.popitem(last=False)
+        else:
+            self._cells.move_to_end(task.id)
+        return cells
+
+    # Gtk.TreeModel interface
+
+    def do_get_flags(self):
+        return Gtk.TreeModelFlags.LIST_ONLY
+
+    def do_get_n_columns(self):
+        return len(self.COLUMN_TYPES)
+
+    def do_get_column_type(self, column):
+        return self.COLUMN_TYPES[column]
+
+    def do_get_iter(self, path):
+        index = path.get_indices()[0]
+        if index < len(self._tasks):
+            return True, self._iter(index)
+        return False, None
+
+    def do_get_path(self, it):
+        return Gtk.TreePath(it.user_data)
+
+    def do_get_value(self, it, column):
+        task = self._tasks[it.user_data]
+        if column == cons.COLUMN_ID:
+            return task.id
+        elif column == cons.COLUMN_DONE:
+            return task.done
+        elif column == cons.COLUMN_TEXT:
+            return task.text or ''
+        date, interval = self._get_cells(task)
+        if column == cons.COLUMN_DATE:
+            return date
+        return interval
+
+    def do_iter_next(self, it):
+        if it.user_data + 1 < len(self._tasks):
+            it.user_data += 1
+            return True
+        return False
+
+    def do_iter_previous(self, it):
+        if it.user_data > 0:
+            it.user_data -= 1
+            return True
+        return False
+
+    def do_iter_has_child(self, it):
+        return False
+
+    def do_iter_n_children(self, it):
+        if it is None:
+            return len(self._tasks)
+        return 0
+
+    def do_iter_children(self, parent):
+        if parent is None and self._tasks:
+            return True, self._iter(0)
+        return False, None
+
+    def do_iter_nth_child(self, parent, n):
+        if parent is None and n < len(self._tasks):
+            return True, self._iter(n)
+        return False, None
+
+    def do_iter_parent(self, child):
+        return False, None
+
+    # changes of tasks
+
+    def _view(self):
+        """Return tasks of the parser which are shown."""
+        tasks = self.parser.get_tasks_view()
+        ids = self.parser.search(self._query) if self._query else None
+        if ids is not None:
+            tasks = tuple(task for task in tasks if task.id in ids)
+        return tasks
+
+    def _shown(self, index):
+        """Return the task with the parser's index if it is the row with
+        the index, i.e. rows are not filtered, otherwise None.
+        """
+        if self._query:
+            return None
+        return self._tasks[index]
+
+    def _update(self, check):
+        """Take the tasks of the parser after a change.
+
+        check is called with the old and new tasks and tells if they
+        differ only by the change, otherwise the parser has read tasks
+        changed by another program and the whole model is refreshed.
+        Return False in that case and when rows are filtered.
+        """
+        if self._query:
+            self.refresh()
+            return False
+        old, self._tasks = self._tasks, self.parser.get_tasks_view()
+        if check(old, self._tasks):
+            return True
+        new, self._tasks = self._tasks, old
+        self._refresh(new)
+        return False
+
+    def add_task(self, *args, **kwargs):
+        """Add a task, arguments are the same as of TaskParser.add_task.
+
+        Return the ID of the task.
+        """
+        task_id = self.parser.add_task(*args, **kwargs)
+        # a task read again is a new object, so the previous last task
+        # shows whether the others have been read by the parser
+        if self._update(lambda old, new: len(new) == len(old) + 1 and
+                        new[-1].id == task_id and
+                        (not old or new[-2] is old[-1])):
+            path = Gtk.TreePath(len(self._tasks) - 1)
+            self.row_inserted(path, self.get_iter(path))
+        return task_id
+
+    def edit_task(self, index, **task):
+        """Edit a task pointed by the index, see TaskParser.edit_task."""
+        task_id = self.parser.get_task(index).id
+        edited = self._shown(index)
+        self.parser.edit_task(index, **task)
+        self._update(lambda old, new: len(new) == len(old) and
+                     new[index] is edited)
+        # the task is changed in place, so refreshing rows does not notice
+        self._cells.pop(task_id, None)
+        try:
+            row = self.row_of(task_id)
+        except KeyError:
+            return
+        path = Gtk.TreePath(row)
+        self.row_changed(path, self.get_iter(path))
+
+    def delete_task(self, index):
+        """Delete a task pointed by the index."""
+        deleted = self._shown(index)
+        self.parser.delete_task(index)
+
+        def check(old, new):
+            if len(new) != len(old) - 1:
+                return False
+            # the task before the deleted one or the one after it
+            if index:
+                return new[index - 1] is old[index - 1]
+            return not new or new[0] is old[1]
+
+        if self._update(check):
+            self._cells.pop(deleted.id, None)
+            self.row_deleted(Gtk.TreePath(index))
+
+    def swap_tasks(self, index_a, index_b):
+        """Swap two tasks, rows keep their places and change contents."""
+        task_a, task_b = self._shown(index_a), self._shown(index_b)
+        self.parser.swap_task(index_a, index_b)
+        if self._update(lambda old, new: len(new) == len(old) and
+                        new[index_a] is task_b and new[index_b] is task_a):
+            for index in (index_a, index_b):
+                path = Gtk.TreePath(index)
+                self.row_changed(path, self.get_iter(path))
+
+    def refresh(self):
+        """Show tasks of the parser after it has read them again."""
+        self._refresh(self._view())
+
+    def row_of(self, task_id):
+        """Return the row number of a task.
+
+        Raise KeyError if the task is not shown.
+        """
+        if not self._query:
+            return self.parser.index_of(task_id)
+        for row, task in enumerate(self._tasks):
+            if task.id == task_id:
+                return row
+        raise KeyError(task_id)
+
+    def _refresh(self, new):
+        """Apply differences between shown tasks and new ones.
+
+        Tasks with the same IDs at the beginning and the end are kept, rows
+        between them are deleted and inserted again.
+        """
+        old = self._tasks
+        self._cells.clear()
+        start = 0
+        common = min(len(old), len(new))
+        while start < common and old[start].id == new[start].id:
+            start += 1
+        end = 0
+        while end < common - start and old[-1 - end].id == new[-1 - end].id:
+            end += 1
+        # rows are deleted from the end, so paths of the others stay valid
+        self._tasks = old[:start] + old[len(old) - end:]
+        for index in reversed(range(start, len(old) - end)):
+            self.row_deleted(Gtk.TreePath(index))
+        self._tasks = new
+        for index in range(start, len(new) - end):
+            path = Gtk.TreePath(index)
+            self.row_inserted(path, self.get_iter(path))
+        # kept rows whose tasks have been changed
+        for index in range(start):
+            if _content(old[index]) != _content(new[index]):
+                path = Gtk.TreePath(index)
+                self.row_changed(path, self.get_iter(path))
+        for index in range(len(new) - end, len(new)):
+            old_index = index - len(new) + len(old)
+            if _content(old[old_index]) != _content(new[index]):
+                path = Gtk.TreePath(index)
+                self.row_changed(path, self.get_iter(path))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import os
+import math
+
+from gi.repository import Gio, GLib
+
+import cons
+
+
+class FileWatcher:
+    """Call a function when any of the files changes.
+
+    Files are watched by GIO monitors (inotify on Linux), modification
+    times are polled if a monitor cannot be created. Changes are collected
+    for cons.WATCH_DELAY milliseconds, so a burst of them gives one call.
+    Files do not need to exist.
+    """
+
+    def __init__(self, paths, callback):
+        """arguments:
+        paths -- paths of the files
+        callback -- function called without arguments
+        """
+        self.callback = callback
+        self._monitors = []
+        self._polled = {}
+        self._timeout = None
+        for path in paths:
+            try:
+                monitor = Gio.File.new_for_path(path).monitor_file(
+                        Gio.FileMonitorFlags.NONE, None)
+            except GLib.Error:
+                self._polled[path] = self._stat(path)
+            else:
+                monitor.connect('changed', self._on_changed)
+                # monitors stop when they are garbage collected
+                self._monitors.append(monitor)
+        if self._polled:
+            GLib.timeout_add_seconds(cons.WATCH_POLL_INTERVAL, self._poll)
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _poll(self):
+        for path, signature in self._polled.items():
+            new_signature = self._stat(path)
+            if new_signature != signature:
+                self._polled[path] = new_signature
+                self._schedule()
+        return bool(self._polled)
+
+    def _on_changed(self, monitor, f, other_file, event_type):
+        if event_type != Gio.FileMonitorEvent.ATTRIBUTE_CHANGED:
+            self._schedule()
+
+    def _schedule(self):
+        if self._timeout is None:
+            self._timeout = GLib.timeout_add(cons.WATCH_DELAY, self._notify)
+
+    def _notify(self):
+        self._timeout = None
+        self.callback()
+        return False
+
+    def stop(self):
+        """Stop watching the files."""
+        for monitor in self._monitors:
+            monitor.cancel()
+        self._monitors = []
+        self._polled = {}
+        if self._timeout is not None:
+            GLib.source_remove(self._timeout)
+            self._timeout = None
+
+
+class ReminderTimer:
+    """Give reminders of a scheduler.ReminderScheduler from the GLib main
+    loop.
+
+    A single timeout waits for the next reminder. It waits at most
+    cons.REMIND_MAX_WAIT seconds, as timeouts stop while the computer
+    sleeps, and nothing is read when it ends.
+    """
+
+    def __init__(self, scheduler, on_reminders=None):
+        """arguments:
+        scheduler -- scheduler.ReminderScheduler object
+        on_reminders -- function called with the list of tasks reminded at
+            once, e.g. to show them in one notification
+        """
+        self.scheduler = scheduler
+        self.on_reminders = on_reminders
+        self._timeout = None
+        self.rearm()
+
+    def rearm(self):
+        """Give due reminders and wait for the next one."""
+        self.stop()
+        reminded = self.scheduler.fire()
+        if reminded and self.on_reminders:
+            self.on_reminders(reminded)
+        seconds = self.scheduler.seconds_left()
+        if seconds is not None:
+            seconds = min(math.ceil(seconds), cons.REMIND_MAX_WAIT)
+            self._timeout = GLib.timeout_add_seconds(max(seconds, 1),
+                                                     self._on_timeout)
+
+    def on_files_changed(self):
+        """Take changes of the tasks, e.g. from a FileWatcher callback."""
+        if self.scheduler.changed():
+            self.rearm()
+
+    def _on_timeout(self):
+        self._timeout = None
+        self.rearm()
+        return False
+
+    def stop(self):
+        """Stop waiting for reminders."""
+        if self._timeout is not None:
+            GLib.source_remove(self._timeout)
+            self._timeout = None
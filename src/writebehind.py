@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import time
+import datetime
+import threading
+import contextlib
+
+import cons
+import parser
+
+
+class WriteBehindParser(parser.TaskParser):
+    """Task parser which writes changes in a background thread.
+
+    Changes are applied to tasks in memory at once and written by the
+    thread some time after the first of them, so a burst of changes is
+    written once and the caller never waits for the disk. Every write is a
+    full one, as in daemon.DaemonTaskList. close() writes the last changes
+    and stops the thread.
+
+    Changes of the storage made by other programs are recognized by a
+    checksum of its files, so they are never written over. Changes which
+    are not written yet are applied again to the tasks changed by another
+    program, see reload().
+    """
+
+    def __init__(self, tasks_path, backend=None, on_error=None,
+                 delay=cons.WRITE_DELAY):
+        """arguments:
+        tasks_path -- path of the todo file
+        backend -- name of the storage backend
+        on_error -- function called by the thread with an exception raised
+            by a write, the changes are written again after the next change
+        delay -- seconds for which changes are collected
+        """
+        super(WriteBehindParser, self).__init__(tasks_path, backend)
+        self.on_error = on_error
+        self.delay = delay
+        self._lock = threading.RLock()
+        self._condition = threading.Condition(self._lock)
+        # time of the first change which is not written yet or None
+        self._unsaved_since = None
+        self._writing = False
+        self._failed = False
+        self._closed = False
+        # functions applying changes which are not written yet again, to
+        # tasks read after another program has changed them, and new IDs
+        # of tasks added again, by their old ones (see _replay)
+        self._operations = []
+        self._replayed_ids = {}
+        # checksum of the storage files as last read or written and the
+        # number of reads (by the end of the last reload() call)
+        self._digest = None
+        self._reads = 0
+        self._reported_reads = 0
+        # close() writes the last changes, the thread does not keep
+        # the program running
+        self._thread = threading.Thread(target=self._run,
+                                        name='write-behind', daemon=True)
+        self._thread.start()
+
+    def _load(self):
+        with self._lock:
+            if self._tasks is not None and \
+                    (self._unsaved_since is not None or self._writing):
+                # the file is older than the tasks or it is being written
+                return self._tasks
+            if not (self._batch_depth and self._tasks is not None):
+                signature = self.storage.signature()
+                if self._tasks is None or signature != self._signature:
+                    # the checksum is taken before reading, so a change
+                    # made in the meantime is noticed later
+                    digest = self.storage.digest()
+                    if self._tasks is not None and digest == self._digest:
+                        # touched or written with the same content
+                        self._signature = signature
+                    else:
+                        self._digest = digest
+                        self._reads += 1
+            return super(WriteBehindParser, self)._load()
+
+    def _write(self, tasks):
+        if self._batch_depth:
+            super(WriteBehindParser, self)._write(tasks)
+            return
+        with self._lock:
+            self._tasks = tasks
+            if self._unsaved_since is None:
+                self._unsaved_since = time.monotonic()
+            self._failed = False
+            self._condition.notify_all()
+
+    def _store(self, method, *args):
+        self._write(self._tasks)
+
+    def _flush(self):
+        """Write a copy of the tasks, called with the lock held.
+
+        The lock is released during the write, so tasks can be changed in
+        the meantime.
+        """
+        tasks = [task.copy() for task in self._tasks]
+        pending, self._pending = self._pending, False
+        checked, self._checked = self._checked, None
+        unsaved_since, self._unsaved_since = self._unsaved_since, None
+        changed_texts, self._changed = self._changed, {}
+        archived, self._archived = self._archived, []
+        operations, self._operations = self._operations, []
+        self._writing = True
+        digest = self._digest
+        stamp = self._stamp
+        self._lock.release()
+        try:
+            if digest is not None and self.storage.digest() != digest:
+                # changed by another program, own changes are applied to
+                # its tasks and written by the next flush
+                changed = True
+            else:
+                changed = False
+                if archived:
+                    # before the list, as in TaskParser._write
+                    self._get_archive().append(archived)
+                    archived = []
+                self.storage.save(tasks)
+                today = datetime.date.today()
+                if pending or checked == today:
+                    self.storage.set_updated(today)
+                digest = self.storage.digest()
+                new_stamp = self.storage.stamp()
+        except Exception:
+            self._lock.acquire()
+            self._pending = self._pending or pending
+            if self._checked is None:
+                self._checked = checked
+            self._archived[:0] = archived
+            self._operations[:0] = operations
+            if self._unsaved_since is None:
+                self._unsaved_since = unsaved_since
+            if changed_texts is None or self._changed is None:
+                self._changed = None
+            else:
+                # texts from before this write are the ones in the storage
+                self._changed.update(changed_texts)
+            raise
+        else:
+            self._lock.acquire()
+            if changed:
+                self._operations[:0] = operations
+                self._replay()
+            else:
+                self._digest = digest
+                self._signature = self.storage.signature()
+                self._stamp = new_stamp
+                self._update_index(changed_texts, stamp,
+                                   {task.id: task for task in tasks}
+                                   if changed_texts else {})
+        finally:
+            self._writing = False
+            self._condition.notify_all()
+
+    def _run(self):
+        with self._lock:
+            while True:
+                while not self._closed and \
+                        (self._unsaved_since is None or self._failed):
+                    self._condition.wait()
+                if self._closed:
+                    return
+                remaining = self._unsaved_since + self.delay - \
+                        time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                try:
+                    self._flush()
+                except Exception as err:
+                    self._failed = True
+                    if self.on_error:
+                        self.on_error(err)
+
+    def _replay(self):
+        """Read tasks changed by another program and apply changes which
+        are not written yet to them, called with the lock held.
+
+        Tasks are found by their IDs, changes of tasks deleted by the other
+        program are dropped. Added tasks get new IDs, as the other program
+        may have given their old ones, so later changes of them are
+        applied to the tasks by the new IDs.
+        """
+        operations, self._operations = self._operations, []
+        self._tasks = None
+        self._unsaved_since = None
+        self._archived = []
+        self._replayed_ids = {}
+        try:
+            for operation in operations:
+                try:
+                    operation()
+                except (KeyError, IndexError):
+                    pass
+        finally:
+            self._replayed_ids = {}
+
+    def _index_of_replayed(self, task_id):
+        """Return the index of a task by its ID from before _replay."""
+        return self.index_of(self._replayed_ids.get(task_id, task_id))
+
+    def reload(self):
+        """Read tasks again if the storage has been changed by another
+        program, e.g. the CLI.
+
+        Return True if tasks have been read from the storage since the last
+        call, i.e. they may differ from the ones shown. Changes which are
+        not written yet are applied again to the read tasks.
+        """
+        with self._lock:
+            while self._writing:
+                self._condition.wait()
+            # the checksum reads the files, so it is taken only when their
+            # modification time, size or inode has changed
+            if self._tasks is not None and \
+                    self.storage.signature() != self._signature and \
+                    self.storage.digest() != self._digest:
+                if self._unsaved_since is None:
+                    self._operations = []
+                self._replay()
+            self._load()
+            reads, self._reported_reads = self._reported_reads, self._reads
+            return reads != self._reads
+
+    def flush(self):
+        """Write changes at once.
+
+        Changes applied again to tasks of another program (see _replay)
+        are written too. Exceptions raised by the write are passed to the
+        caller.
+        """
+        with self._lock:
+            while True:
+                while self._writing:
+                    self._condition.wait()
+                if self._unsaved_since is None:
+                    return
+                self._flush()
+
+    def close(self):
+        """Stop the thread and write the last changes."""
+        with self._lock:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.flush()
+
+    def search(self, query):
+        with self._lock:
+            # texts being written are neither in the index nor in _changed
+            while self._writing:
+                self._condition.wait()
+            return super(WriteBehindParser, self).search(query)
+
+    # changes of tasks are not written while the thread copies them, they
+    # are remembered by IDs of tasks for _replay
+
+    @contextlib.contextmanager
+    def batch(self):
+        with self._lock:
+            start = len(self._operations)
+            try:
+                with super(WriteBehindParser, self).batch():
+                    yield self
+            except BaseException:
+                if not self._batch_depth:
+                    # the parser has dropped the tasks, changes made before
+                    # the batch are applied again, its own ones are not
+                    del self._operations[start:]
+                    if self._unsaved_since is not None:
+                        self._replay()
+                raise
+
+    transaction = batch
+
+    def save_tasks(self, tasks):
+        with self._lock:
+            super(WriteBehindParser, self).save_tasks(tasks)
+            saved = [task.copy() for task in self._tasks]
+            self._operations.append(lambda: self.save_tasks(saved))
+
+    def add_task(self, text=None, date=None, interval=None, done=False):
+        with self._lock:
+            task_id = super(WriteBehindParser, self).add_task(
+                text, date, interval, done)
+
+            def add():
+                self._replayed_ids[task_id] = self.add_task(
+                    text, date, interval, done)
+            self._operations.append(add)
+            return task_id
+
+    def delete_task(self, index):
+        with self._lock:
+            task_id = self._load()[index].id
+            super(WriteBehindParser, self).delete_task(index)
+            self._operations.append(
+                lambda: self.delete_task(self._index_of_replayed(task_id)))
+
+    def edit_task(self, index, **task):
+        with self._lock:
+            task_id = self._load()[index].id
+            super(WriteBehindParser, self).edit_task(index, **task)
+            self._operations.append(
+                lambda: self.edit_task(self._index_of_replayed(task_id),
+                                       **task))
+
+    def swap_task(self, index_a, index_b):
+        with self._lock:
+            tasks = self._load()
+            id_a, id_b = tasks[index_a].id, tasks[index_b].id
+            super(WriteBehindParser, self).swap_task(index_a, index_b)
+            self._operations.append(
+                lambda: self.swap_task(self._index_of_replayed(id_a),
+                                       self._index_of_replayed(id_b)))
+
+    def update(self):
+        with self._lock:
+            super(WriteBehindParser, self).update()
+            self._operations.append(self.update)
+
+    def archive_tasks(self, age=None):
+        with self._lock:
+            moved = super(WriteBehindParser, self).archive_tasks(age)
+            self._operations.append(lambda: self.archive_tasks(age))
+            return moved
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests of reading and writing version 1 and 2 JSON todo files."""
+
+
+import os
+import sys
+import json
+import shutil
+import datetime
+import tempfile
+import unittest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       os.pardir, 'src')
+sys.path.insert(0, SRC_DIR)
+
+import cons
+import codec
+import storage
+from task import Task
+
+
+TASKS = [
+    Task('buy milk', datetime.date(2026, 1, 31), cons.MONTH, False, 1),
+    Task('zażółć "gęślą" jaźń\n', None, None, True, 2),
+    Task('water plants', datetime.date(2024, 2, 29), 3, False, 5),
+    Task('', datetime.date(1999, 12, 31), cons.YEAR, True, 7),
+]
+
+
+def version_1(tasks, ids=True):
+    """Return a todo file written by older pytasks."""
+    records = []
+    for task in tasks:
+        record = {'text': task.text,
+                  'date': task.date.strftime(cons.DATE_FORMAT)
+                  if task.date else None,
+                  'interval': task.interval, 'done': task.done}
+        if ids:
+            record['id'] = task.id
+        records.append(record)
+    return json.dumps(records)
+
+
+class CodecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'todo.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        data = codec.encode_tasks(TASKS)
+        self.assertEqual(json.loads(data)[0], {'version': codec.VERSION})
+        self.assertEqual(codec.decode_tasks(data), TASKS)
+
+    def use_library(self, name):
+        """Select the JSON library until the end of the test."""
+        saved = cons.JSON_LIBRARY, codec._library
+        self.addCleanup(setattr, cons, 'JSON_LIBRARY', saved[0])
+        self.addCleanup(setattr, codec, '_library', saved[1])
+        cons.JSON_LIBRARY, codec._library = name, None
+        try:
+            codec.library()
+        except ImportError:
+            self.skipTest('{} is not installed'.format(name))
+
+    def test_libraries(self):
+        data = codec.encode_tasks(TASKS)
+        for name in ('json', 'orjson', 'msgspec'):
+            with self.subTest(name):
+                self.use_library(name)
+                self.assertEqual(codec.decode_tasks(data), TASKS)
+                self.assertEqual(
+                    codec.decode_tasks(codec.encode_tasks(TASKS)), TASKS)
+
+    def test_version_1(self):
+        self.assertEqual(codec.decode_tasks(version_1(TASKS)), TASKS)
+        without_ids = codec.decode_tasks(version_1(TASKS, ids=False))
+        self.assertEqual([task.id for task in without_ids], [None] * 4)
+
+    def test_upgrade(self):
+        with open(self.path, 'w') as f:
+            f.write(version_1(TASKS))
+        backend = storage.JSONStorage(self.path)
+        backend.save(backend.load())
+        with open(self.path) as f:
+            self.assertEqual(json.loads(f.read())[0],
+                             {'version': codec.VERSION})
+        self.assertEqual(backend.load(), TASKS)
+
+    def test_stream(self):
+        backend = storage.JSONStorage(self.path)
+        for data in (version_1(TASKS), codec.encode_tasks(TASKS)):
+            with open(self.path, 'w') as f:
+                f.write(data)
+            self.assertEqual(list(backend.iter_tasks()), TASKS)
+            self.assertEqual(list(backend.iter_tasks(done=True)),
+                             [task for task in TASKS if task.done])
+            undated = list(backend.iter_tasks(dates=False))
+            self.assertEqual([task.date for task in undated], [None] * 4)
+            self.assertEqual(backend.count(done=False), 2)
+
+    def test_empty_and_broken(self):
+        self.assertEqual(codec.decode_tasks(''), [])
+        self.assertEqual(codec.decode_tasks('[{"version": 2}, ["a"'), [])
+        self.assertEqual(codec.decode_tasks(codec.encode_tasks([])), [])
+
+    def test_newer_version(self):
+        with self.assertRaises(codec.VersionError):
+            codec.decode_tasks('[{"version": 3}]')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests of the journal storage and its compaction."""
+
+
+import os
+import sys
+import shutil
+import datetime
+import tempfile
+import unittest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       os.pardir, 'src')
+sys.path.insert(0, SRC_DIR)
+
+import cons
+import codec
+import storage
+from task import Task
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'todo.txt')
+        self.tasks = [Task('task {}'.format(i), datetime.date(2026, 1, 31),
+                           cons.MONTH, False, i) for i in range(1, 4)]
+        self.storage = self.open()
+        self.storage.save(self.tasks)
+        self.tasks = self.storage.load()
+
+    def tearDown(self):
+        self.storage.wait()
+        shutil.rmtree(self.dir)
+
+    def open(self, compact_size=cons.JOURNAL_COMPACT_SIZE):
+        return storage.JournalStorage(self.path, compact_size)
+
+    def change(self, storage, tasks, n):
+        """Make n changes of each kind."""
+        for i in range(n):
+            task_id = max(task.id for task in tasks) + 1
+            task = Task('new {}'.format(task_id), None, None, False, task_id)
+            tasks.append(task)
+            storage.add(tasks, task)
+            tasks[0].text += '!'
+            tasks[0].done = not tasks[0].done
+            storage.edit(tasks, 0, tasks[0])
+            tasks[1], tasks[-1] = tasks[-1], tasks[1]
+            storage.swap(tasks, 1, len(tasks) - 1)
+            storage.delete(tasks, 2, tasks.pop(2))
+
+    def assertStored(self, tasks):
+        self.assertEqual(self.open().load(), tasks)
+
+    def journal_size(self):
+        return os.path.getsize(self.storage.journal_path)
+
+    def test_replay(self):
+        self.change(self.storage, self.tasks, 3)
+        self.assertGreater(self.journal_size(), 0)
+        self.assertStored(self.tasks)
+
+    def test_compact(self):
+        self.change(self.storage, self.tasks, 3)
+        self.storage.compact(self.tasks)
+        with open(self.storage.journal_path, 'rb') as f:
+            self.assertEqual(len(f.read().splitlines()), 1)
+        self.assertEqual(storage.JSONStorage(self.path).load(), self.tasks)
+        self.assertStored(self.tasks)
+        # changes after the compaction go to the new journal
+        self.change(self.storage, self.tasks, 2)
+        self.assertStored(self.tasks)
+
+    def test_background_compact(self):
+        self.storage = self.open(compact_size=500)
+        self.tasks = self.storage.load()
+        for i in range(10):
+            self.change(self.storage, self.tasks, 2)
+            self.storage.wait()
+            self.assertLess(self.journal_size(), 1000)
+            self.assertStored(self.tasks)
+
+    def test_appended_during_compact(self):
+        self.change(self.storage, self.tasks, 2)
+        # the state the compactor starts from
+        data = codec.encode_tasks(self.tasks)
+        offset, generation = (self.storage._journal_size,
+                              self.storage._generation)
+        self.change(self.storage, self.tasks, 2)
+        self.storage._compact(data, offset, generation)
+        self.assertEqual(storage.JSONStorage(self.path).load(),
+                         codec.decode_tasks(data))
+        self.assertStored(self.tasks)
+
+    def test_compact_after_save(self):
+        self.change(self.storage, self.tasks, 2)
+        data = codec.encode_tasks(self.tasks)
+        offset, generation = (self.storage._journal_size,
+                              self.storage._generation)
+        self.tasks.pop()
+        self.storage.save(self.tasks)
+        # a compaction of a replaced snapshot does nothing
+        self.storage._compact(data, offset, generation)
+        self.assertStored(self.tasks)
+
+    def test_stale_journal(self):
+        self.change(self.storage, self.tasks, 2)
+        # a compaction interrupted after writing the snapshot
+        storage.write_atomic(self.path,
+                             codec.encode_tasks(self.tasks).encode('utf-8'))
+        self.assertStored(self.tasks)
+        backend = self.open()
+        tasks = backend.load()
+        self.change(backend, tasks, 1)
+        self.assertStored(tasks)
+
+    def test_partial_record(self):
+        self.change(self.storage, self.tasks, 1)
+        with open(self.storage.journal_path, 'ab') as f:
+            f.write(b'{"op": "delete", "id": 1')
+        self.assertStored(self.tasks)
+        backend = self.open()
+        tasks = backend.load()
+        self.change(backend, tasks, 1)
+        self.assertStored(tasks)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests of moving repeating tasks to their next occurrence."""
+
+
+import os
+import sys
+import datetime
+import calendar
+import unittest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       os.pardir, 'src')
+sys.path.insert(0, SRC_DIR)
+
+import cons
+import recurrence
+from task import Task
+
+
+def step_by_step(date, interval, today):
+    """Return the next occurrence found one interval at a time."""
+    while interval and date < today:
+        if interval == cons.MONTH:
+            date = recurrence.add_months(date, 1)
+        elif interval == cons.YEAR:
+            date = recurrence.add_months(date, 12)
+        else:
+            date += datetime.timedelta(days=interval)
+    return date
+
+
+def cases():
+    """Yield dates, intervals and todays around ends of months."""
+    starts = [datetime.date(year, month, day)
+              for year in (2023, 2024) for month in (1, 2, 3, 12)
+              for day in (1, 28, 29, 30, 31)
+              if day <= calendar.monthrange(year, month)[1]]
+    todays = [datetime.date(2024, 2, 29), datetime.date(2024, 3, 1),
+              datetime.date(2026, 10, 20), datetime.date(2031, 1, 31)]
+    for date in starts:
+        for interval in (cons.MONTH, cons.YEAR, 1, 7, 30):
+            for today in todays:
+                yield date, interval, today
+
+
+class RecurrenceTest(unittest.TestCase):
+
+    def test_month_end(self):
+        date = datetime.date(2026, 1, 31)
+        today = datetime.date(2026, 10, 20)
+        self.assertEqual(recurrence.next_occurrence(date, cons.MONTH, today),
+                         datetime.date(2026, 10, 28))
+        # daily runs give the same date as one run after a gap
+        day = datetime.date(2026, 2, 1)
+        while day <= today:
+            date = recurrence.next_occurrence(date, cons.MONTH, day)
+            day += datetime.timedelta(days=1)
+        self.assertEqual(date, datetime.date(2026, 10, 28))
+
+    def test_leap_day(self):
+        date = datetime.date(2024, 2, 29)
+        self.assertEqual(recurrence.next_occurrence(
+            date, cons.YEAR, datetime.date(2027, 6, 1)),
+            datetime.date(2028, 2, 28))
+        self.assertEqual(recurrence.add_months(date, 48),
+                         datetime.date(2028, 2, 29))
+
+    def test_not_overdue(self):
+        today = datetime.date(2026, 10, 20)
+        for interval in (None, 0, cons.MONTH, 3):
+            self.assertEqual(recurrence.next_occurrence(
+                today, interval, today), today)
+        past = datetime.date(2026, 1, 1)
+        self.assertEqual(recurrence.next_occurrence(past, None, today), past)
+
+    def test_step_by_step(self):
+        for date, interval, today in cases():
+            self.assertEqual(recurrence.next_occurrence(date, interval, today),
+                             step_by_step(date, interval, today),
+                             (date, interval, today))
+
+    @unittest.skipUnless(recurrence._get_numpy(), 'NumPy is not installed')
+    def test_numpy(self):
+        for today in {today for _, _, today in cases()}:
+            overdue = [(date, interval) for date, interval, day in cases()
+                       if day == today and date < today]
+            dates, intervals = zip(*overdue)
+            self.assertEqual(
+                recurrence._advance_numpy(dates, intervals, today),
+                [step_by_step(date, interval, today)
+                 for date, interval in overdue], today)
+
+    def test_advance_tasks(self):
+        today = datetime.date(2026, 10, 20)
+        tasks = [Task('a', datetime.date(2026, 1, 31), cons.MONTH),
+                 Task('b', datetime.date(2026, 10, 1)),
+                 Task('c', datetime.date(2026, 11, 1), 7),
+                 Task('d', datetime.date(2026, 10, 13), 7)]
+        self.assertEqual(recurrence.advance_tasks(tasks, today), [0, 3])
+        self.assertEqual([task.date for task in tasks],
+                         [datetime.date(2026, 10, 28),
+                          datetime.date(2026, 10, 1),
+                          datetime.date(2026, 11, 1),
+                          datetime.date(2026, 10, 20)])
+
+
+if __name__ == '__main__':
+    unittest.main()
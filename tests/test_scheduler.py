@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests of reminders given by ReminderScheduler."""
+
+
+import os
+import sys
+import shutil
+import datetime
+import tempfile
+import unittest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       os.pardir, 'src')
+sys.path.insert(0, SRC_DIR)
+
+import parser
+import scheduler
+
+
+class RestartTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'todo.txt')
+        open(self.path, 'w').close()
+        self.state_path = scheduler.state_path_for(self.path)
+        today = datetime.date.today()
+        self.parser = parser.TaskParser(self.path)
+        self.parser.add_task('overdue', today - datetime.timedelta(days=3))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def fire(self):
+        return [task.text for task in scheduler.ReminderScheduler(
+            self.parser, [], state_path=self.state_path).fire()]
+
+    def test_no_repeat_after_restart(self):
+        self.assertEqual(self.fire(), ['overdue'])
+        self.assertEqual(self.fire(), [])
+
+    def test_new_task_after_restart(self):
+        self.fire()
+        self.parser.add_task('new', datetime.date.today() +
+                             datetime.timedelta(days=1))
+        now = datetime.datetime.now() + datetime.timedelta(days=2)
+        reminded = scheduler.ReminderScheduler(
+            self.parser, [], state_path=self.state_path).fire(now)
+        self.assertEqual([task.text for task in reminded], ['new'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests of statistics recorded by reads of JSON todo files."""
+
+
+import os
+import sys
+import shutil
+import datetime
+import tempfile
+import unittest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       os.pardir, 'src')
+sys.path.insert(0, SRC_DIR)
+
+import storage
+import parser
+from task import Task
+from stats import STATS
+
+
+class StatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'todo.txt')
+        storage.JSONStorage(self.path).save([
+            Task('one', datetime.date.today(), None, False, 1),
+            Task('two', None, None, True, 2)])
+        STATS.reset()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        STATS.reset()
+
+    def assertCalls(self, name, calls):
+        self.assertEqual(STATS.timings[name][1], calls, name)
+
+    def test_load(self):
+        parser.TaskParser(self.path).select_tasks(sort=True)
+        self.assertCalls('json_decode', 1)
+        self.assertCalls('task_decode', 1)
+        self.assertEqual(STATS.counters['tasks_filtered'], 2)
+
+    def test_stream(self):
+        tasks = list(parser.TaskParser(self.path).iter_tasks(done=True))
+        self.assertEqual([task.text for task in tasks], ['two'])
+        self.assertCalls('json_decode', 1)
+        self.assertCalls('task_decode', 1)
+        self.assertEqual(STATS.counters['tasks_filtered'], 2)
+        self.assertEqual(STATS.counters['tasks_streamed'], 1)
+
+    def test_stream_closed(self):
+        # stats of a stream are recorded also when it is not read to its end
+        tasks = parser.TaskParser(self.path).iter_tasks()
+        next(tasks)
+        tasks.close()
+        self.assertCalls('json_decode', 1)
+        self.assertEqual(STATS.counters['tasks_streamed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
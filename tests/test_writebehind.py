@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests of WriteBehindParser with changes made by other programs."""
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       os.pardir, 'src')
+sys.path.insert(0, SRC_DIR)
+
+import parser
+import writebehind
+
+
+class ConflictTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'todo.txt')
+        open(self.path, 'w').close()
+        # the thread does not write during a test
+        self.parser = writebehind.WriteBehindParser(self.path, delay=3600)
+
+    def tearDown(self):
+        self.parser.close()
+        shutil.rmtree(self.dir)
+
+    def stored(self):
+        return [(task.text, task.done)
+                for task in parser.TaskParser(self.path).get_tasks()]
+
+    def test_close_writes_replayed_changes(self):
+        self.parser.add_task('gui')
+        parser.TaskParser(self.path).add_task('cli')
+        self.parser.close()
+        self.assertEqual(self.stored(), [('cli', False), ('gui', False)])
+
+    def test_reload_keeps_unsaved_changes(self):
+        self.parser.add_task('gui')
+        self.parser.flush()
+        self.parser.edit_task(0, done=True)
+        parser.TaskParser(self.path).add_task('cli')
+        self.assertTrue(self.parser.reload())
+        self.assertEqual([(task.text, task.done)
+                          for task in self.parser.get_tasks()],
+                         [('gui', True), ('cli', False)])
+        self.parser.flush()
+        self.assertEqual(self.stored(), [('gui', True), ('cli', False)])
+
+    def test_replay_follows_new_ids(self):
+        # the other program gives the ID of the unsaved task to its own one
+        task_id = self.parser.add_task('gui')
+        self.parser.edit_task(self.parser.index_of(task_id), text='edited',
+                              done=True)
+        other = parser.TaskParser(self.path)
+        self.assertEqual(other.add_task('cli'), task_id)
+        other.add_task('cli 2')
+        self.parser.flush()
+        self.assertEqual(self.stored(), [('cli', False), ('cli 2', False),
+                                         ('edited', True)])
+
+    def test_replay_deletes_added_task(self):
+        task_id = self.parser.add_task('gui')
+        self.parser.add_task('kept')
+        self.parser.delete_task(self.parser.index_of(task_id))
+        parser.TaskParser(self.path).add_task('cli')
+        self.parser.flush()
+        self.assertEqual(self.stored(), [('cli', False), ('kept', False)])
+
+
+if __name__ == '__main__':
+    unittest.main()